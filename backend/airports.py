@@ -0,0 +1,42 @@
+import csv
+import os
+from functools import lru_cache
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+AIRPORTS_FILE = os.path.join(DATA_DIR, "airports.csv")
+
+
+@lru_cache(maxsize=1)
+def load_airports():
+    """Bundled airport dataset, keyed by IATA code"""
+    airports = {}
+    with open(AIRPORTS_FILE, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            row["latitude"] = float(row["latitude"])
+            row["longitude"] = float(row["longitude"])
+            airports[row["iata"]] = row
+    return airports
+
+
+@lru_cache(maxsize=1)
+def city_codes():
+    """Lower-cased city name -> Amadeus location code (metropolitan city code where one exists)"""
+    return {airport["city"].lower(): airport["city_code"] for airport in load_airports().values()}
+
+
+def get_airport(code):
+    return load_airports().get(code.strip().upper())
+
+
+def lookup_city_code(name):
+    """Resolve a city name or IATA code from the bundled dataset, or None if it is not listed"""
+    key = name.strip()
+    if len(key) == 3 and key.isupper() and get_airport(key):
+        return key
+    return city_codes().get(key.lower())
+
+
+def airports_for(code):
+    """Airports behind an IATA airport or metropolitan city code, e.g. NYC -> JFK, LGA, EWR"""
+    code = code.strip().upper()
+    return [airport for airport in load_airports().values() if code in (airport["iata"], airport["city_code"])]
@@ -1,80 +1,148 @@
-import os
-from amadeus import Client, ResponseError
+from amadeus import ResponseError
 from dotenv import load_dotenv
 from datetime import datetime
+from collections import Counter
+from airports import lookup_city_code
+from ttl_cache import TTLCache, SQLiteStore
+from records import FlightOffer, FlightSearch
+from render import flight_lines
+from clients import amadeus_client
 
 load_dotenv()
 
-amadeus = Client(
-    client_id=os.getenv("AMADEUS_API_KEY"),
-    client_secret=os.getenv("AMADEUS_API_SECRET")
-)
+# City -> IATA mappings practically never change, so Amadeus answers are kept for a month
+CODE_CACHE_TTL_SECONDS = 30 * 24 * 3600
+code_cache = TTLCache(max_entries=4096, ttl_seconds=CODE_CACHE_TTL_SECONDS, store=SQLiteStore("location_codes"))
+code_stats = Counter()
 
 def resolve_city_to_code(city_name):
+    # Common cities and airport codes come straight from the bundled dataset
+    code = lookup_city_code(city_name)
+    if code:
+        code_stats["dataset"] += 1
+        return code
+
+    cache_key = city_name.strip().lower()
+    code = code_cache.get(cache_key)
+    if code:
+        code_stats["cache"] += 1
+        return code
+
     try:
         # Search for city or airport code
-        response = amadeus.reference_data.locations.get(
+        code_stats["api"] += 1
+        response = amadeus_client().reference_data.locations.get(
             keyword=city_name,
             subType='CITY,AIRPORT'
         )
         if response.data and len(response.data) > 0:
+            code = response.data[0]["iataCode"]
             for location in response.data:
                 if location.get("subType") == "CITY":
-                    return location["iataCode"]
-            return response.data[0]["iataCode"]
+                    code = location["iataCode"]
+                    break
+            code_cache.set(cache_key, code)
+            return code
         return city_name[:3].upper()
     except ResponseError as error:
         print(f"Amadeus city lookup error: {error}")
         return city_name[:3].upper()
 
-def get_flight_prices_with_links(origin, destination, date):
-    try:
-        # Normalize date to YYYY-MM-DD
-        try:
-            datetime.strptime(date, '%Y-%m-%d')
-            normalized_date = date
-        except ValueError:
-            normalized_date = datetime.now().strftime('%Y-%m-%d')
-        origin_code = resolve_city_to_code(origin)
-        destination_code = resolve_city_to_code(destination)
-        print(f"[Amadeus] Requesting flights: {origin_code} -> {destination_code} on {normalized_date}")
-        response = amadeus.shopping.flight_offers_search.get(
+# Flight offers change quickly: serve them fresh for 5 minutes, then stale for up to
+# 15 more while a background search refreshes them
+OFFER_CACHE_TTL_SECONDS = 5 * 60
+OFFER_STALE_SECONDS = 15 * 60
+offer_cache = TTLCache(max_entries=2048, ttl_seconds=OFFER_CACHE_TTL_SECONDS)
+
+def search_flight_offers(origin_code, destination_code, date, adults=1):
+    """
+    Raw Amadeus offers for a route and date, shared across users through offer_cache.
+    Identical concurrent searches are coalesced into one API call.
+    """
+    def search():
+        print(f"[Amadeus] Requesting flights: {origin_code} -> {destination_code} on {date}")
+        response = amadeus_client().shopping.flight_offers_search.get(
             originLocationCode=origin_code,
             destinationLocationCode=destination_code,
-            departureDate=normalized_date,
-            adults=1,
+            departureDate=date,
+            adults=adults,
             max=3,
             currencyCode="USD"
         )
         print(f"[Amadeus] Raw API response: {response.data}")
-        if not response.data:
-            print(f"[Amadeus] No flights found for {origin_code} to {destination_code} on {normalized_date}")
-            return [f"❌ No flights found from {origin_code} to {destination_code} on {normalized_date}"]
-        results = response.data
-        formatted = []
-        for i, offer in enumerate(results[:3]):
-            segments = offer["itineraries"][0]["segments"]
-            first = segments[0]["departure"]
-            last = segments[-1]["arrival"]
-            price = offer["price"]["total"]
-            airline = offer["validatingAirlineCodes"][0]
-            duration = offer["itineraries"][0]["duration"].replace("PT", "").lower()
-            link = f"https://www.google.com/flights?hl=en#flt={origin_code}.{destination_code}.{normalized_date};c:USD;e:1;sd:1;t:f"
-            formatted.append(
-                f"{i+1}. {airline} – ${price}\n   🕐 Duration: {duration}\n   🛫 Departs: {first['at']} from {first['iataCode']}\n   🛬 Arrives: {last['at']} at {last['iataCode']}\n   🔗 [Book here]({link})"
-            )
-        return [f"✈️ Flight Options ({origin_code} → {destination_code} on {normalized_date}):\n\n"] + formatted
+        return response.data or []
+
+    return offer_cache.get_or_load(
+        (origin_code, destination_code, date, adults),
+        search,
+        stale_seconds=OFFER_STALE_SECONDS
+    )
+
+def code_resolution_stats():
+    """How city/airport codes were resolved: bundled dataset, cache or Amadeus API"""
+    total = sum(code_stats.values())
+    local = code_stats["dataset"] + code_stats["cache"]
+    return {
+        **code_stats,
+        "hit_rate": round(local / total, 3) if total else 0.0,
+        "memory_cache": code_cache.stats()
+    }
+
+def flight_offer_from_amadeus(offer, link):
+    segments = offer["itineraries"][0]["segments"]
+    first = segments[0]["departure"]
+    last = segments[-1]["arrival"]
+    return FlightOffer(
+        airline=offer["validatingAirlineCodes"][0],
+        price=offer["price"]["total"],
+        duration=offer["itineraries"][0]["duration"].replace("PT", "").lower(),
+        departs_at=first["at"],
+        departs_from=first["iataCode"],
+        arrives_at=last["at"],
+        arrives_to=last["iataCode"],
+        link=link
+    )
+
+def search_flights(origin, destination, date):
+    """Up to three offers for a city pair and date as a FlightSearch; failures are reported in .error"""
+    # Normalize date to YYYY-MM-DD
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+        normalized_date = date
+    except ValueError:
+        normalized_date = datetime.now().strftime('%Y-%m-%d')
+    origin_code, destination_code = origin, destination
+    try:
+        origin_code = resolve_city_to_code(origin)
+        destination_code = resolve_city_to_code(destination)
+        results = search_flight_offers(origin_code, destination_code, normalized_date)
     except ResponseError as error:
         error_msg = str(error)
         print(f"[Amadeus] ResponseError: {error_msg}")
+        if "404" in error_msg:
+            # Not a failure: there is simply nothing on this route
+            return FlightSearch(origin_code, destination_code, normalized_date)
         if "400" in error_msg:
-            return [f"❌ Invalid request: Please check if the cities and date are valid"]
+            error_msg = "Invalid request: Please check if the cities and date are valid"
         elif "401" in error_msg:
-            return [f"❌ Authentication error: Please check API credentials"]
-        elif "404" in error_msg:
-            return [f"❌ No flights found for the specified route"]
+            error_msg = "Authentication error: Please check API credentials"
         else:
-            return [f"❌ Flight API error: {error_msg}"]
+            error_msg = f"Flight API error: {error_msg}"
+        return FlightSearch(origin_code, destination_code, normalized_date, error=error_msg)
     except Exception as e:
         print(f"[Amadeus] Exception: {e}")
-        return [f"❌ Error: {e}"] 
\ No newline at end of file
+        return FlightSearch(origin_code, destination_code, normalized_date, error=f"Error: {e}")
+
+    if not results:
+        print(f"[Amadeus] No flights found for {origin_code} to {destination_code} on {normalized_date}")
+    link = f"https://www.google.com/flights?hl=en#flt={origin_code}.{destination_code}.{normalized_date};c:USD;e:1;sd:1;t:f"
+    try:
+        offers = tuple(flight_offer_from_amadeus(offer, link) for offer in results[:3])
+    except (KeyError, IndexError) as e:
+        print(f"[Amadeus] Unexpected offer format: {e}")
+        return FlightSearch(origin_code, destination_code, normalized_date, error=f"Error: unexpected offer format ({e})")
+    return FlightSearch(origin_code, destination_code, normalized_date, offers)
+
+def get_flight_prices_with_links(origin, destination, date):
+    """Flight options as chat lines, see render.flight_lines"""
+    return flight_lines(search_flights(origin, destination, date))
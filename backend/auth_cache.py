@@ -0,0 +1,56 @@
+import os
+import threading
+import time
+from typing import NamedTuple
+from ttl_cache import TTLCache
+
+# Verified tokens are remembered for this long, or until they expire if that is sooner
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL", 15 * 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+
+class AuthUser(NamedTuple):
+    """What request handlers need to know about the caller, without a database session"""
+    id: int
+    email: str
+    name: str
+
+
+# Memory only: bearer tokens are never written to disk
+token_cache = TTLCache(max_entries=AUTH_CACHE_MAX_ENTRIES, ttl_seconds=AUTH_CACHE_TTL_SECONDS)
+# Bumped for an email to drop every cached token of that account, e.g. on a password change
+_generations = {}
+_lock = threading.Lock()
+
+
+def _generation(email):
+    with _lock:
+        return _generations.get(email, 0)
+
+
+def cached_user(token):
+    """The AuthUser verified earlier for `token`, or None"""
+    entry = token_cache.get(token)
+    if entry is None:
+        return None
+    user, generation = entry
+    if generation != _generation(user.email):
+        return None
+    return user
+
+
+def cache_user(token, user, expires_at):
+    """Remember `user` for `token` until `expires_at` (a Unix time) or AUTH_CACHE_TTL_SECONDS"""
+    ttl_seconds = min(AUTH_CACHE_TTL_SECONDS, expires_at - time.time())
+    if ttl_seconds > 0:
+        token_cache.set(token, (user, _generation(user.email)), ttl_seconds=ttl_seconds)
+
+
+def invalidate_user(email):
+    """Forget every cached token of this account"""
+    with _lock:
+        _generations[email] = _generations.get(email, 0) + 1
+
+
+def auth_cache_stats():
+    return token_cache.stats()
@@ -0,0 +1,374 @@
+"""
+Load benchmarks for the travel assistant backend.
+Upstream services are replaced with stubs of fixed latency so the numbers
+reflect the server's own scheduling, not network conditions.
+
+Usage: python benchmark.py chat [--requests 200] [--latency 0.2]
+       python benchmark.py dates [--llm-latency 0.8]
+       python benchmark.py routes [--queries 10000]
+       python benchmark.py itineraries [--requests 200] [--llm-latency 2.0]
+       python benchmark.py startup [--runs 5]
+       python benchmark.py auth [--requests 5000]
+       python benchmark.py logins [--logins 32] [--chats 100] [--latency 0.2] [--bcrypt-rounds 12]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+
+def percentiles(samples):
+    """Return (p50, p99) in milliseconds"""
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+def print_result(label, samples, elapsed):
+    p50, p99 = percentiles(samples)
+    print(f"{label:<28} p50={p50:8.3f} ms  p99={p99:8.3f} ms  throughput={len(samples) / elapsed:7.1f} req/s")
+
+
+def bench_chat(requests_count, latency):
+    """Compare calling chat_with_gemini on the event loop against the worker pool offload"""
+    import os
+    import tempfile
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_users.db')}")
+    import server
+
+    def stub_chat(message, session_id=None):
+        # Stands in for the blocking Gemini/Amadeus/Hotellook round trips
+        time.sleep(latency)
+        return "ok"
+
+    server.chat_with_gemini = stub_chat
+
+    async def inline_turn(i):
+        stub_chat(f"message {i}", f"bench:{i}")
+
+    async def offloaded_turn(i):
+        await server.run_chat(f"message {i}", f"bench:{i}")
+
+    async def run(turn):
+        # Latency is measured from submission, so time spent queued behind
+        # other requests is included
+        submitted = time.perf_counter()
+
+        async def timed(i):
+            await turn(i)
+            return time.perf_counter() - submitted
+
+        samples = await asyncio.gather(*(timed(i) for i in range(requests_count)))
+        return samples, time.perf_counter() - submitted
+
+    print(f"{requests_count} concurrent requests, {latency * 1000:.0f} ms stubbed upstream, {server.CHAT_WORKERS} workers")
+    samples, elapsed = asyncio.run(run(inline_turn))
+    print_result("blocking (event loop)", samples, elapsed)
+    samples, elapsed = asyncio.run(run(offloaded_turn))
+    print_result("thread pool offload", samples, elapsed)
+
+
+# Date expressions as users type them into the chat
+SAMPLE_DATES = [
+    "28 aug", "aug 28", "28th august", "August 28, 2026", "2026-09-15", "12/20",
+    "next friday", "friday", "tomorrow", "in 2 weeks", "three days from now",
+    "next week", "next month", "this weekend", "summer", "end of summer",
+    "early spring", "winter 2026", "the 3rd of march", "sept 5",
+    "christmas", "sometime after easter", "the week after next", "around my birthday"
+]
+
+
+def bench_dates(llm_latency):
+    """Measure how many dates the local parser resolves without a Gemini round trip"""
+    from date_parser import parse_date_locally, _parse_normalized
+
+    _parse_normalized.cache_clear()
+    start = time.perf_counter()
+    resolved = [parse_date_locally(text) for text in SAMPLE_DATES]
+    local_seconds = (time.perf_counter() - start) / len(SAMPLE_DATES)
+
+    start = time.perf_counter()
+    for text in SAMPLE_DATES:
+        parse_date_locally(text)
+    cached_seconds = (time.perf_counter() - start) / len(SAMPLE_DATES)
+
+    hits = sum(1 for result in resolved if result)
+    for text, result in zip(SAMPLE_DATES, resolved):
+        print(f"  {text!r:<28} -> {result or 'LLM fallback'}")
+    print(f"resolved locally: {hits}/{len(SAMPLE_DATES)} ({hits / len(SAMPLE_DATES):.0%})")
+    print(f"local parse: {local_seconds * 1e6:.1f} us uncached, {cached_seconds * 1e6:.1f} us cached")
+    # A message can carry up to three dates to normalize
+    saved = hits / len(SAMPLE_DATES) * (llm_latency - local_seconds)
+    print(f"expected latency saved per date: {saved * 1000:.0f} ms, per 3-date message: {saved * 3000:.0f} ms "
+          f"(assuming {llm_latency * 1000:.0f} ms per Gemini call)")
+
+
+ROUTE_QUERIES = [
+    ("NYC", "Yellowstone"), ("SFO", "LON"), ("BOS", "JAC"), ("Yosemite", "LAX"),
+    ("CHI", "Grand Canyon"), ("SEA", "Glacier"), ("LAX", "Machu Picchu"), ("PAR", "Amalfi Coast")
+]
+
+
+def bench_routes(queries):
+    """Time the spatial index, ground-transport estimates and local route planning"""
+    import random
+    import route_planner
+
+    route_planner.candidate_routes("NYC", "Yellowstone")  # load the datasets once
+    index = route_planner.airport_index()
+    points = [(random.uniform(-50, 65), random.uniform(-180, 180)) for _ in range(queries)]
+
+    samples = []
+    start = time.perf_counter()
+    for latitude, longitude in points:
+        began = time.perf_counter()
+        index.within(latitude, longitude, route_planner.POI_RADIUS_KM)
+        samples.append(time.perf_counter() - began)
+    print_result(f"airports within {route_planner.POI_RADIUS_KM} km", samples, time.perf_counter() - start)
+
+    samples = []
+    start = time.perf_counter()
+    for _ in range(queries // 10):
+        began = time.perf_counter()
+        route_planner.get_ground_transportation("JAC", "Yellowstone")
+        samples.append(time.perf_counter() - began)
+    print_result("ground transportation", samples, time.perf_counter() - start)
+
+    samples = []
+    start = time.perf_counter()
+    for i in range(queries // 10):
+        origin, destination = ROUTE_QUERIES[i % len(ROUTE_QUERIES)]
+        began = time.perf_counter()
+        route_planner.candidate_routes(origin, destination)
+        samples.append(time.perf_counter() - began)
+    print_result("candidate routes", samples, time.perf_counter() - start)
+    print(f"indexed airports: {len(index)}, hubs: {len(route_planner.hubs())}")
+
+
+# Itinerary requests as users phrase them: the same trips come up again, worded differently
+ITINERARY_REQUESTS = [
+    ("Paris", "3", "museums and food"), ("paris", "3 days", "Food, museums"), ("Paris", "3", "art museums and local food"),
+    ("Tokyo", "5", "anime, sushi"), ("Tokyo", "5", "sushi and anime"), ("Rome", "4", "history"),
+    ("Rome", "4", "historic sites"), ("New York", "3", "broadway shows and pizza"), ("NYC", "3", "shopping"),
+    ("London", "2", "pubs, museums"), ("London", "2", "museums and pubs"), ("Barcelona", "4", "beaches, tapas")
+]
+
+
+def bench_itineraries(requests_count, llm_latency):
+    """Itinerary generation through the LLM cache, with and without the similarity lookup"""
+    import os
+    import tempfile
+    os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_cache.db")
+    import llm_cache
+    import sample
+
+    class StubChat:
+        """Stands in for a Gemini chat; every generated reply costs `llm_latency`"""
+        history = []
+
+        def send_message(self, prompt, stream=False):
+            time.sleep(llm_latency)
+            return type("Reply", (), {"text": f"Day 1: ... ({len(prompt)} character prompt)"})()
+
+    session = sample.sessions.get("bench:itineraries")
+    session.chat = StubChat()
+    for similarity in (False, True):
+        llm_cache.SIMILARITY_ENABLED = similarity
+        llm_cache.response_cache._entries.clear()
+        llm_cache.response_cache.store.trim(0)
+        llm_cache._similarity_index.clear()
+        llm_cache._lookups.clear()
+
+        hits, misses = [], []
+        start = time.perf_counter()
+        for i in range(requests_count):
+            destination, duration, interests = ITINERARY_REQUESTS[i % len(ITINERARY_REQUESTS)]
+            lookups_before = llm_cache.llm_cache_stats()["misses"]
+            began = time.perf_counter()
+            sample.generate_itinerary_html(session, destination, duration, interests)
+            elapsed = time.perf_counter() - began
+            (misses if llm_cache.llm_cache_stats()["misses"] > lookups_before else hits).append(elapsed)
+        total = time.perf_counter() - start
+        label = "exact + similarity" if similarity else "exact keys"
+        print(f"{label}: {llm_cache.llm_cache_stats()}")
+        if len(hits) > 1:
+            print_result("  cache hit", hits, total)
+        if len(misses) > 1:
+            print_result(f"  miss ({llm_latency * 1000:.0f} ms stubbed Gemini)", misses, total)
+
+
+def bench_startup(runs):
+    """Time importing the server in fresh interpreters, then the deferred client warm-up"""
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    # The interpreters inherit this, so importing the server never touches ./users.db
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_users.db')}")
+
+    script = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        "import server\n"
+        "imported = time.perf_counter() - started\n"
+        "from sample import warm_up_chat\n"
+        "started = time.perf_counter()\n"
+        "warm_up_chat()\n"
+        "print(imported, time.perf_counter() - started, 'google.generativeai' in sys.modules)\n"
+    )
+    imports, warm_ups = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-W", "ignore", "-c", script], capture_output=True, text=True, check=True)
+        imported, warmed, _ = output.stdout.split()[-3:]
+        imports.append(float(imported))
+        warm_ups.append(float(warmed))
+    print(f"{runs} fresh interpreters")
+    print(f"import server: median {statistics.median(imports) * 1000:.0f} ms, max {max(imports) * 1000:.0f} ms")
+    print(f"warm-up (startup hook): median {statistics.median(warm_ups) * 1000:.0f} ms, max {max(warm_ups) * 1000:.0f} ms")
+
+
+def bench_auth(requests_count):
+    """Per-request cost of get_current_user: legacy token with a user lookup, uid claim, cache hit"""
+    import os
+    import tempfile
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_users.db')}")
+    import auth_cache
+    import server
+
+    db = server.SessionLocal()
+    user = server.User(name="Bench", email=f"bench-{time.time()}@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    tokens = {
+        "sub only (user lookup)": server.create_access_token({"sub": user.email}),
+        "uid claim": server.user_token(user)
+    }
+
+    def run(label, token, cached):
+        samples = []
+        start = time.perf_counter()
+        for _ in range(requests_count):
+            if not cached:
+                auth_cache.token_cache._entries.clear()
+            began = time.perf_counter()
+            assert server.get_current_user(token, db).id == user.id
+            samples.append(time.perf_counter() - began)
+        print_result(label, samples, time.perf_counter() - start)
+
+    for label, token in tokens.items():
+        run(label, token, cached=False)
+    run("cache hit", tokens["uid claim"], cached=True)
+    db.close()
+
+
+def bench_logins(logins, chats, latency, bcrypt_rounds):
+    """
+    /api/chat latency while a burst of logins arrives, with bcrypt run the old way
+    (inline in FastAPI's shared threadpool) and on the bounded password pool.
+    bcrypt is called directly, with the cost factor passlib uses, so the numbers do
+    not depend on the installed passlib/bcrypt pairing.
+    """
+    import os
+    import tempfile
+    import bcrypt
+    from fastapi import HTTPException
+    from fastapi.concurrency import run_in_threadpool
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_users.db')}")
+    import server
+
+    def stub_chat(message, session_id=None):
+        time.sleep(latency)
+        return "ok"
+
+    server.chat_with_gemini = stub_chat
+    server.verify_password = lambda password, hashed: bcrypt.checkpw(password.encode(), hashed.encode())
+    server.message_writer.put = lambda *objects: None
+
+    db = server.SessionLocal()
+    hashed = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(bcrypt_rounds)).decode()
+    user = server.create_user(db, "Bench", f"bench-{time.time()}@example.com", hashed)
+    token = server.user_token(user)
+    login_request = server.LoginRequest(email=user.email, password="correct horse")
+
+    def inline_login():
+        # What the synchronous endpoint did: lookup and bcrypt on the request's threadpool thread
+        found = server.find_user(db, login_request.email)
+        return server.verify_password(login_request.password, found.hashed_password)
+
+    async def pooled_login():
+        try:
+            await server.login(login_request, db)
+            return "ok"
+        except HTTPException as e:
+            return e.status_code
+
+    async def run(login_mode):
+        # A steady stream of chats, one every 20 ms, with the login burst arriving at the start
+        if login_mode == "inline":
+            burst = [asyncio.ensure_future(run_in_threadpool(inline_login)) for _ in range(logins)]
+        elif login_mode == "pool":
+            burst = [asyncio.ensure_future(pooled_login()) for _ in range(logins)]
+        else:
+            burst = []
+
+        async def timed_chat(i):
+            await asyncio.sleep(i * 0.02)
+            began = time.perf_counter()
+            await server.chat(server.ChatRequest(message=f"message {i}", token=token), db)
+            return time.perf_counter() - began
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(timed_chat(i) for i in range(chats)))
+        elapsed = time.perf_counter() - started
+        outcomes = await asyncio.gather(*burst)
+        return samples, elapsed, time.perf_counter() - started, outcomes
+
+    print(f"{chats} chats ({latency * 1000:.0f} ms stubbed turn), {logins} logins at bcrypt cost {bcrypt_rounds}, "
+          f"{server.PASSWORD_WORKERS} password workers, {os.cpu_count()} CPUs")
+    for mode, label in ((None, "chat only"), ("inline", "chat + logins inline"), ("pool", "chat + logins on pool")):
+        samples, elapsed, total, outcomes = asyncio.run(run(mode))
+        print_result(label, samples, elapsed)
+        if mode:
+            rejected = sum(1 for outcome in outcomes if outcome == 503)
+            print(f"  {logins} logins done in {total:.1f} s, {rejected} rejected with 503")
+    db.close()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Backend load benchmarks")
+    subparsers = arg_parser.add_subparsers(dest="benchmark", required=True)
+    chat_parser = subparsers.add_parser("chat", help="/api/chat turn scheduling")
+    chat_parser.add_argument("--requests", type=int, default=200)
+    chat_parser.add_argument("--latency", type=float, default=0.2)
+    dates_parser = subparsers.add_parser("dates", help="local date normalization hit rate")
+    dates_parser.add_argument("--llm-latency", type=float, default=0.8)
+    routes_parser = subparsers.add_parser("routes", help="spatial index and local route planning")
+    routes_parser.add_argument("--queries", type=int, default=10000)
+    itineraries_parser = subparsers.add_parser("itineraries", help="LLM response cache for itineraries")
+    itineraries_parser.add_argument("--requests", type=int, default=200)
+    itineraries_parser.add_argument("--llm-latency", type=float, default=2.0)
+    startup_parser = subparsers.add_parser("startup", help="server import time and client warm-up")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    auth_parser = subparsers.add_parser("auth", help="per-request token verification and user lookup")
+    auth_parser.add_argument("--requests", type=int, default=5000)
+    logins_parser = subparsers.add_parser("logins", help="chat latency during a login burst")
+    logins_parser.add_argument("--logins", type=int, default=32)
+    logins_parser.add_argument("--chats", type=int, default=100)
+    logins_parser.add_argument("--latency", type=float, default=0.2)
+    logins_parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    args = arg_parser.parse_args()
+
+    if args.benchmark == "chat":
+        bench_chat(args.requests, args.latency)
+    elif args.benchmark == "dates":
+        bench_dates(args.llm_latency)
+    elif args.benchmark == "routes":
+        bench_routes(args.queries)
+    elif args.benchmark == "itineraries":
+        bench_itineraries(args.requests, args.llm_latency)
+    elif args.benchmark == "startup":
+        bench_startup(args.runs)
+    elif args.benchmark == "auth":
+        bench_auth(args.requests)
+    elif args.benchmark == "logins":
+        bench_logins(args.logins, args.chats, args.latency, args.bcrypt_rounds)
@@ -0,0 +1,63 @@
+import os
+import threading
+from collections import Counter
+
+# Token budget for the user-facing conversation history resent with every chat message
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 6000))
+# Leading messages never dropped: the assistant instructions and greeting seeded by new_chat
+PINNED_MESSAGES = 2
+
+_metrics_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), good enough for budgeting"""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message):
+    parts = message["parts"] if isinstance(message, dict) else message.parts
+    return sum(estimate_tokens(part if isinstance(part, str) else getattr(part, "text", "")) for part in parts)
+
+
+def history_tokens(history):
+    return sum(message_tokens(message) for message in history)
+
+
+def compact_history(chat, budget=HISTORY_TOKEN_BUDGET):
+    """
+    Keep a Gemini chat's history within `budget` tokens by dropping the oldest
+    prompt/reply pairs after the pinned instructions. Returns the number of messages dropped.
+    """
+    history = list(chat.history)
+    pinned, turns = history[:PINNED_MESSAGES], history[PINNED_MESSAGES:]
+    total = history_tokens(history)
+    dropped = 0
+    # Always keep the latest exchange, even if it alone is over budget
+    while total > budget and len(turns) > 2:
+        total -= message_tokens(turns[0]) + message_tokens(turns[1])
+        turns = turns[2:]
+        dropped += 2
+    if dropped:
+        chat.history = pinned + turns
+        print(f"Compacted chat history: dropped {dropped} messages, ~{total} tokens remain")
+    return dropped
+
+
+def record_prompt(session, kind, tokens):
+    """Add a prompt's size to the session's per-turn metrics"""
+    with _metrics_lock:
+        session.turn_metrics[f"{kind}_calls"] += 1
+        session.turn_metrics[f"{kind}_prompt_tokens"] += tokens
+
+
+def start_turn_metrics(session):
+    with _metrics_lock:
+        session.turn_metrics = Counter()
+
+
+def turn_metrics_summary(session):
+    with _metrics_lock:
+        metrics = dict(session.turn_metrics)
+    metrics["total_prompt_tokens"] = sum(value for key, value in metrics.items() if key.endswith("_prompt_tokens"))
+    return metrics
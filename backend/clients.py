@@ -0,0 +1,58 @@
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-1.5-flash-latest")
+
+# Clients built so far, by name; each is created on first use and shared by every module
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_or_build(name, build):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = build()
+                _clients[name] = client
+    return client
+
+
+def _build_gemini_model():
+    # google.generativeai takes about half a second to import, so it is only loaded when first needed
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+
+def _build_amadeus_client():
+    from amadeus import Client
+    return Client(
+        client_id=os.getenv("AMADEUS_API_KEY"),
+        client_secret=os.getenv("AMADEUS_API_SECRET")
+    )
+
+
+def gemini_model():
+    """The shared Gemini model handle"""
+    return _get_or_build("gemini", _build_gemini_model)
+
+
+def amadeus_client():
+    """The shared Amadeus client"""
+    return _get_or_build("amadeus", _build_amadeus_client)
+
+
+def warm_up():
+    """Build every client now instead of on the first request; returns the seconds each took"""
+    timings = {}
+    for name, get in (("gemini", gemini_model), ("amadeus", amadeus_client)):
+        started = time.perf_counter()
+        get()
+        timings[name] = round(time.perf_counter() - started, 3)
+    return timings
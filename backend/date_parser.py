@@ -0,0 +1,171 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from dateutil import parser
+from dateutil.relativedelta import relativedelta
+
+MONTH_PATTERN = re.compile(r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b")
+NUMERIC_DATE_PATTERN = re.compile(r"\b\d{4}-\d{1,2}-\d{1,2}\b|\b\d{1,2}[/.]\d{1,2}([/.]\d{2,4})?\b")
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+# European dotted dates are day first; dateutil would read "28.08" as a decimal number
+DOTTED_DATE_PATTERN = re.compile(r"^\d{1,2}\.\d{1,2}(\.\d{2}|\.\d{4})?$")
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12
+}
+# Meteorological season start (month, day), northern hemisphere
+SEASON_STARTS = {
+    "spring": (3, 1),
+    "summer": (6, 1),
+    "fall": (9, 1),
+    "autumn": (9, 1),
+    "winter": (12, 1)
+}
+# Offset into the three-month season for qualifiers like "mid summer"
+SEASON_OFFSETS = {"": 0, "early": 0, "mid": 1, "late": 2, "end of": 2}
+
+RELATIVE_PATTERN = re.compile(r"^(?:in\s+)?(\d+|[a-z]+)\s+(day|week|month)s?(?:\s+from\s+now)?$")
+WEEKDAY_PATTERN = re.compile(r"^(this|next|on|coming)?\s*(" + "|".join(WEEKDAYS) + r")$")
+SEASON_PATTERN = re.compile(r"^(?:this\s+|next\s+)?(early|mid|late|end of)?\s*(spring|summer|fall|autumn|winter)(?:\s+((?:19|20)\d{2}))?$")
+
+# Answers from the LLM fallback, keyed like the local cache by (input, reference date)
+FALLBACK_CACHE_SIZE = 4096
+_fallback_dates = OrderedDict()
+_fallback_lock = threading.Lock()
+
+
+def parse_date_locally(date_str, reference_date=None):
+    """
+    Normalize a date expression like '28 aug', 'next friday' or 'summer' to YYYY-MM-DD
+    without an LLM call. Returns None when the expression is not understood.
+    Dates without a year resolve to their next occurrence on or after `reference_date`.
+    """
+    if not date_str:
+        return None
+    return _parse_normalized(_normalize_text(date_str), reference_date or date.today())
+
+
+def recall_date(date_str, reference_date=None):
+    """Return a previously remembered fallback answer for `date_str`, or None"""
+    key = (_normalize_text(date_str), reference_date or date.today())
+    with _fallback_lock:
+        result = _fallback_dates.get(key)
+        if result is not None:
+            _fallback_dates.move_to_end(key)
+        return result
+
+
+def remember_date(date_str, normalized_date, reference_date=None):
+    """Memoize a valid YYYY-MM-DD answer obtained from the LLM fallback"""
+    key = (_normalize_text(date_str), reference_date or date.today())
+    with _fallback_lock:
+        _fallback_dates[key] = normalized_date
+        _fallback_dates.move_to_end(key)
+        while len(_fallback_dates) > FALLBACK_CACHE_SIZE:
+            _fallback_dates.popitem(last=False)
+
+
+def _normalize_text(date_str):
+    return re.sub(r"\s+", " ", str(date_str).strip().lower().replace(",", " ")).strip()
+
+
+@lru_cache(maxsize=4096)
+def _parse_normalized(text, reference_date):
+    for rule in (_parse_keyword, _parse_relative, _parse_weekday, _parse_season, _parse_calendar_date):
+        result = rule(text, reference_date)
+        if result is not None:
+            return result.strftime("%Y-%m-%d")
+    return None
+
+
+def _parse_keyword(text, today):
+    keywords = {
+        "today": 0,
+        "tonight": 0,
+        "tomorrow": 1,
+        "day after tomorrow": 2,
+        "the day after tomorrow": 2
+    }
+    if text in keywords:
+        return today + timedelta(days=keywords[text])
+    if text == "next week":
+        return today + timedelta(days=7 - today.weekday())
+    if text == "next month":
+        return (today + relativedelta(months=1)).replace(day=1)
+    if text in ["this weekend", "weekend"]:
+        return today + timedelta(days=(5 - today.weekday()) % 7)
+    if text == "next weekend":
+        return today + timedelta(days=(5 - today.weekday()) % 7 + 7)
+    return None
+
+
+def _parse_relative(text, today):
+    match = RELATIVE_PATTERN.match(text)
+    # A bare "3 days" is more likely a trip length than a date
+    if not match or not (text.startswith("in ") or text.endswith("from now")):
+        return None
+    amount, unit = match.groups()
+    count = int(amount) if amount.isdigit() else NUMBER_WORDS.get(amount)
+    if count is None:
+        return None
+    if unit == "day":
+        return today + timedelta(days=count)
+    if unit == "week":
+        return today + timedelta(weeks=count)
+    return today + relativedelta(months=count)
+
+
+def _parse_weekday(text, today):
+    match = WEEKDAY_PATTERN.match(text)
+    if not match:
+        return None
+    qualifier, weekday = match.groups()
+    days_ahead = (WEEKDAYS.index(weekday) - today.weekday()) % 7
+    # "next friday" on a Friday means a week from today
+    if days_ahead == 0 and qualifier == "next":
+        days_ahead = 7
+    return today + timedelta(days=days_ahead)
+
+
+def _parse_season(text, today):
+    match = SEASON_PATTERN.match(text)
+    if not match:
+        return None
+    qualifier, season, year = match.groups()
+    month, day = SEASON_STARTS[season]
+    start = date(int(year) if year else today.year, month, day)
+    result = start + relativedelta(months=SEASON_OFFSETS[qualifier or ""])
+    if qualifier == "end of":
+        result = result + relativedelta(day=31)
+    if not year and result < today:
+        result = result + relativedelta(years=1)
+    return result
+
+
+def _parse_calendar_date(text, today):
+    # Only hand text to dateutil when it clearly names a date; it happily turns "3 days" into one
+    if not (MONTH_PATTERN.search(text) or NUMERIC_DATE_PATTERN.search(text)):
+        return None
+    text = re.sub(r"^(on\s+)?(the\s+)?", "", text)
+    try:
+        if DOTTED_DATE_PATTERN.match(text):
+            parsed = _parse_dotted_date(text, today)
+        else:
+            parsed = parser.parse(text, default=datetime(today.year, 1, 1)).date()
+    except (ValueError, OverflowError):
+        return None
+    if not YEAR_PATTERN.search(text) and parsed < today:
+        parsed = parsed + relativedelta(years=1)
+    return parsed
+
+
+def _parse_dotted_date(text, today):
+    parts = text.split(".")
+    if len(parts) == 2:
+        # Parsed with the reference year so "29.02" is only rejected when that year has no such day
+        return datetime.strptime(f"{text}.{today.year}", "%d.%m.%Y").date()
+    return datetime.strptime(text, "%d.%m.%Y" if len(parts[2]) == 4 else "%d.%m.%y").date()
@@ -1,15 +1,15 @@
-import requests
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+from date_parser import parse_date_locally, recall_date, remember_date
+from http_client import upstream
+from ttl_cache import TTLCache, SQLiteStore
+from records import HotelOffer, HotelSearch
+from render import hotel_lines
+from clients import gemini_model
 
 load_dotenv()
 
-# Initialize Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("models/gemini-1.5-flash-latest")
-
 # Replace with your actual affiliate token
 AFFILIATE_TOKEN = os.getenv('HOTEL_API')
 
@@ -22,24 +22,65 @@ def search_location(query, token=AFFILIATE_TOKEN):
         'limit': 1,
         'token': token
     }
-    response = requests.get(url, params=params)
+    response = upstream.get(url, params=params)
     response.raise_for_status()
     # print(f'Location response: {response.json()}')
     return response.json()
 
+# A city's Hotellook location id never changes, so lookups are kept for a month and survive restarts
+LOCATION_CACHE_TTL_SECONDS = 30 * 24 * 3600
+location_cache = TTLCache(max_entries=4096, ttl_seconds=LOCATION_CACHE_TTL_SECONDS, store=SQLiteStore("hotel_locations"))
+
+# cache.json is Hotellook's own snapshot of recent prices and lags live rates anyway, so an
+# hour-old answer (30 minutes fresh, 30 stale, see TTLCache.get_or_load) is still as good as new
+HOTEL_CACHE_TTL_SECONDS = 30 * 60
+HOTEL_STALE_SECONDS = 30 * 60
+price_cache = TTLCache(max_entries=2048, ttl_seconds=HOTEL_CACHE_TTL_SECONDS)
+
+def resolve_location_id(city_name, token=AFFILIATE_TOKEN):
+    """Hotellook location id for a city, or None. Concurrent lookups of one city share a call."""
+    def lookup():
+        location_data = search_location(city_name, token).get('results')
+        if not location_data or not location_data.get('locations'):
+            return None
+        return location_data['locations'][0]['id']
+
+    return location_cache.get_or_load(
+        ' '.join(city_name.lower().split()),
+        lookup,
+        should_cache=lambda location_id: location_id is not None
+    )
+
 def get_hotel_prices(location_id, check_in, check_out, token=AFFILIATE_TOKEN):
-    url = 'https://engine.hotellook.com/api/v2/cache.json'
-    params = {
-        'locationId': location_id,
-        'checkIn': check_in,
-        'checkOut': check_out,
-        'adults': 2,
-        'limit': 5,
-        'token': token
+    """
+    Raw Hotellook prices for a location and stay, shared across users through price_cache.
+    Everyone planning the same city and dates waits on a single cache.json request.
+    """
+    def search():
+        url = 'https://engine.hotellook.com/api/v2/cache.json'
+        params = {
+            'locationId': location_id,
+            'checkIn': check_in,
+            'checkOut': check_out,
+            'adults': 2,
+            'limit': 5,
+            'token': token
+        }
+        response = upstream.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    return price_cache.get_or_load(
+        (str(location_id), check_in, check_out),
+        search,
+        stale_seconds=HOTEL_STALE_SECONDS
+    )
+
+def hotel_cache_stats():
+    return {
+        "locations": location_cache.stats(),
+        "prices": price_cache.stats()
     }
-    response = requests.get(url, params=params)
-    response.raise_for_status()
-    return response.json()
 
 def display_hotels(hotels):
     if not hotels:
@@ -57,7 +98,8 @@ def display_hotels(hotels):
 
 def normalize_date_for_hotel(date_str):
     """
-    Use Gemini to normalize any date format into YYYY-MM-DD
+    Normalize any date format into YYYY-MM-DD, falling back to Gemini for
+    expressions the local parser does not understand
     """
     try:
         # If already in YYYY-MM-DD format, validate and return
@@ -66,6 +108,10 @@ def normalize_date_for_hotel(date_str):
             return date_str
         except ValueError:
             pass
+
+        local_date = parse_date_locally(date_str) or recall_date(date_str)
+        if local_date:
+            return local_date
             
         prompt = (
             "Convert this date to YYYY-MM-DD format. "
@@ -74,12 +120,13 @@ def normalize_date_for_hotel(date_str):
             "Return ONLY the date in YYYY-MM-DD format, nothing else. "
             f"Date to normalize: {date_str}"
         )
-        response = model.generate_content(prompt)
+        response = gemini_model().generate_content(prompt)
         normalized_date = response.text.strip()
         
         # Validate the date format using datetime
         try:
             datetime.strptime(normalized_date, '%Y-%m-%d')
+            remember_date(date_str, normalized_date)
             return normalized_date
         except ValueError:
             raise ValueError(f"Invalid date format: {date_str}")
@@ -88,52 +135,47 @@ def normalize_date_for_hotel(date_str):
         print(f"❌ Error normalizing date '{date_str}': {e}")
         raise ValueError(f"Invalid date format: {date_str}")
 
-def get_hotel_prices_with_links(city_name, check_in, check_out, token=AFFILIATE_TOKEN):
+def search_hotels(city_name, check_in, check_out, token=AFFILIATE_TOKEN):
+    """Hotel offers for a stay as a HotelSearch; failures are reported in .error"""
     try:
         # Normalize dates
         check_in_date = normalize_date_for_hotel(check_in)
         check_out_date = normalize_date_for_hotel(check_out)
-        
-        location_data = search_location(city_name, token).get('results')
-        if not location_data or not location_data.get('locations'):
+    except ValueError as e:
+        return HotelSearch(city_name, check_in, check_out, error=str(e))
+
+    try:
+        location_id = resolve_location_id(city_name, token)
+        if location_id is None:
             print(f"No location found for {city_name}.")
-            return []
-            
-        location_id = location_data['locations'][0]['id']
+            return HotelSearch(city_name, check_in_date, check_out_date)
         print(f"Location ID for {city_name}: {location_id}")
-        
-        url = 'https://engine.hotellook.com/api/v2/cache.json'
-        params = {
-            'locationId': location_id,
-            'checkIn': check_in_date,
-            'checkOut': check_out_date,
-            'adults': 2,
-            'limit': 5,
-            'token': token
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        hotels = response.json()
-        
-        formatted_hotels = []
-        for idx, hotel in enumerate(hotels, start=1):
-            name = hotel.get('hotelName', 'N/A')
-            stars = hotel.get('stars', 'N/A')
-            price = hotel.get('priceFrom', 'N/A')
-            currency = hotel.get('currency', 'USD')
-            link = f"https://www.hotellook.com/hotels/{hotel['hotelId']}"
-            formatted_hotels.append(f"{idx}. {name} ({stars} stars) - {price} {currency}\nLink: {link}")
-        return formatted_hotels
+
+        hotels = get_hotel_prices(location_id, check_in_date, check_out_date, token)
+        offers = tuple(
+            HotelOffer(
+                name=hotel.get('hotelName', 'N/A'),
+                stars=hotel.get('stars', 'N/A'),
+                price=hotel.get('priceFrom', 'N/A'),
+                currency=hotel.get('currency', 'USD'),
+                link=f"https://www.hotellook.com/hotels/{hotel['hotelId']}"
+            )
+            for hotel in hotels
+        )
+        return HotelSearch(city_name, check_in_date, check_out_date, offers)
     except Exception as e:
         print(f"❌ Error getting hotel prices: {e}")
-        return []
+        return HotelSearch(city_name, check_in_date, check_out_date, error=str(e))
+
+def get_hotel_prices_with_links(city_name, check_in, check_out, token=AFFILIATE_TOKEN):
+    """Hotel options as chat lines, see render.hotel_lines"""
+    return hotel_lines(search_hotels(city_name, check_in, check_out, token))
 
 # Example usage
 if __name__ == "__main__":
     city = 'Las Vegas'
-    location_data = search_location(city).get('results')
-    if location_data.get('locations'):
-        location_id = location_data['locations'][0]['id']
+    location_id = resolve_location_id(city)
+    if location_id is not None:
         check_in_date = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
         check_out_date = (datetime.now() + timedelta(days=33)).strftime('%Y-%m-%d')
         hotels = get_hotel_prices(location_id, check_in_date, check_out_date)
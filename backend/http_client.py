@@ -0,0 +1,162 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter
+from functools import partial
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds; a hung upstream must never hold a worker forever
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 10))
+# Retries after the first attempt, with full-jitter exponential backoff between them
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", 2))
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 4.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# In-flight requests allowed per host; also the size of each host's keep-alive pool
+PER_HOST_CONCURRENCY = int(os.getenv("UPSTREAM_PER_HOST_CONCURRENCY", 16))
+# Consecutive failed calls that open a host's circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET", 30))
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without contacting the host while its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for `reset_seconds`.
+    Then a single trial call is let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+
+class UpstreamClient:
+    """
+    Shared HTTP client for third-party APIs: one keep-alive requests.Session,
+    per-host concurrency caps and circuit breakers, timeouts on every call and
+    retries with jittered exponential backoff on connection errors and 429/5xx replies.
+    """
+
+    def __init__(self, per_host_concurrency=PER_HOST_CONCURRENCY, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries=MAX_RETRIES):
+        self.per_host_concurrency = per_host_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=per_host_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = Counter()
+        self._host_limits = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def _host_state(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_concurrency)
+                self._breakers[host] = CircuitBreaker()
+            return self._host_limits[host], self._breakers[host]
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def get(self, url, params=None, **kwargs):
+        """
+        GET with retries. Returns the last response (callers check its status as before)
+        or raises the last connection error, or CircuitOpenError if the host is failing.
+        """
+        host = urlsplit(url).netloc
+        limit, breaker = self._host_state(host)
+        if not breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(f"Circuit open for {host}, not calling it for now")
+
+        response, error = None, None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                time.sleep(self._backoff(attempt - 1, response))
+            try:
+                with limit:
+                    self.stats["requests"] += 1
+                    response = self.session.get(url, params=params, timeout=self.timeout, **kwargs)
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+                continue
+            except Exception:
+                # Anything else (ChunkedEncodingError, TooManyRedirects, ...) is not retried, but must
+                # still be recorded: a half-open circuit otherwise waits for its trial call forever
+                breaker.record_failure()
+                self.stats["failures"] += 1
+                raise
+            if response.status_code not in RETRY_STATUSES:
+                # Any other answer, 4xx included, means the host itself is healthy
+                breaker.record_success()
+                return response
+
+        breaker.record_failure()
+        self.stats["failures"] += 1
+        print(f"Upstream {host} failed after {self.max_retries + 1} attempts (circuit {breaker.state})")
+        if error is not None:
+            raise error
+        return response
+
+    async def get_async(self, url, params=None, **kwargs):
+        """Async variant of get for callers on an event loop; the blocking call runs on the loop's executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.get, url, params, **kwargs))
+
+    def circuit_states(self):
+        with self._lock:
+            return {host: breaker.state for host, breaker in self._breakers.items()}
+
+
+# Shared by every upstream module so connections are reused across users and requests
+upstream = UpstreamClient()
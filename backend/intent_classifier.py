@@ -0,0 +1,145 @@
+import re
+import threading
+from collections import Counter
+from date_parser import parse_date_locally, NUMBER_WORDS
+
+GREETINGS = {
+    "hi", "hello", "hey", "yo", "hiya", "howdy", "greetings", "hola", "sup",
+    "good morning", "good afternoon", "good evening", "hi there", "hello there", "hey there"
+}
+
+RESET_PHRASES = [
+    "new trip",
+    "start over",
+    "reset",
+    "clear",
+    "plan another trip",
+    "different trip",
+    "let's plan something else"
+]
+
+# Well-known destinations recognised without asking Gemini whether they are cities
+KNOWN_CITIES = {
+    "amsterdam", "athens", "atlanta", "auckland", "austin", "bali", "bangkok", "barcelona",
+    "beijing", "berlin", "bogota", "boston", "brussels", "budapest", "buenos aires", "cairo",
+    "cancun", "cape town", "chicago", "copenhagen", "dallas", "delhi", "new delhi", "denver",
+    "dubai", "dublin", "edinburgh", "florence", "frankfurt", "geneva", "hanoi", "havana",
+    "helsinki", "ho chi minh city", "hong kong", "honolulu", "houston", "istanbul", "jakarta",
+    "jerusalem", "johannesburg", "kuala lumpur", "kyoto", "las vegas", "lima", "lisbon",
+    "london", "los angeles", "madrid", "manila", "marrakech", "melbourne", "mexico city",
+    "miami", "milan", "montreal", "moscow", "mumbai", "munich", "nairobi", "naples", "nashville",
+    "new orleans", "new york", "orlando", "osaka", "oslo", "paris", "perth",
+    "philadelphia", "phoenix", "prague", "reykjavik", "rio de janeiro", "rome", "san diego",
+    "san francisco", "santiago", "seattle", "seoul", "shanghai", "singapore", "stockholm",
+    "sydney", "taipei", "tel aviv", "tokyo", "toronto", "vancouver", "venice", "vienna",
+    "warsaw", "washington", "zurich", "bangalore", "bengaluru", "chennai", "hyderabad",
+    "kolkata", "goa", "jaipur", "doha", "abu dhabi", "riyadh", "seville", "porto", "krakow",
+    "salzburg", "lyon", "marseille", "manchester", "glasgow", "san jose", "portland",
+    "salt lake city", "minneapolis", "detroit", "calgary", "quebec city", "cusco", "rio"
+}
+
+FILLER_PATTERN = re.compile(r"\b(please|let's|lets|let us|can we|could we|i want to|i'd like to|actually)\b")
+DURATION_PATTERN = re.compile(r"^(?:for\s+)?(?:about\s+)?(\d+|[a-z]+)\s*(day|night|week)s?$")
+
+REQUIRED_FIELDS = ["destination", "duration", "interests", "departure_date", "origin"]
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def classify_intent_locally(user_input, trip_context):
+    """
+    Resolve greetings, resets, trip lengths, dates and well-known city names without Gemini.
+    Returns a dict shaped like parse_user_intent's result, or None when the message
+    is ambiguous and needs the LLM.
+    """
+    text = re.sub(r"[!?.,]+$", "", user_input.strip().lower()).strip()
+    result = (
+        _classify_greeting(text)
+        or _classify_reset(text)
+        or _classify_duration(text, trip_context)
+        or _classify_date(text, trip_context)
+        or _classify_city(user_input, text, trip_context)
+    )
+    with _stats_lock:
+        if result:
+            _stats["hits"] += 1
+            _stats[result["intent"]] += 1
+        else:
+            _stats["misses"] += 1
+    return result
+
+
+def classifier_stats():
+    """Hit/miss counters; every hit is one Gemini round trip saved"""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = round(stats.get("hits", 0) / total, 3) if total else 0.0
+    return stats
+
+
+def _intent(intent, trip_context, extracted_info=None, is_greeting=False, is_reset=False):
+    extracted_info = extracted_info or {}
+    merged = {**trip_context, **extracted_info}
+    missing_info = [field for field in REQUIRED_FIELDS if not merged.get(field)]
+    return {
+        "intent": intent,
+        "is_greeting": is_greeting,
+        "is_reset": is_reset,
+        "extracted_info": extracted_info,
+        "missing_info": missing_info,
+        "next_question": "Where would you like to go?" if "destination" in missing_info else "What else can I help you plan?"
+    }
+
+
+def _classify_greeting(text):
+    if text in GREETINGS:
+        return _intent("greeting", {}, is_greeting=True)
+    return None
+
+
+def _classify_reset(text):
+    # Only the bare phrase, give or take politeness; "clear skies please" is not a reset
+    stripped = re.sub(r"\s+", " ", FILLER_PATTERN.sub("", text)).strip()
+    if stripped in RESET_PHRASES or stripped in ["start a new trip", "plan a new trip", "start again"]:
+        return _intent("reset", {}, is_reset=True)
+    return None
+
+
+def _classify_duration(text, trip_context):
+    match = DURATION_PATTERN.match(text)
+    if not match and text.isdigit() and trip_context.get("destination") and not trip_context.get("duration"):
+        # A bare number right after we asked "how many days" is the trip length
+        match = DURATION_PATTERN.match(f"{text} days")
+    if not match:
+        return None
+    amount, unit = match.groups()
+    count = int(amount) if amount.isdigit() else NUMBER_WORDS.get(amount)
+    if not count:
+        return None
+    days = count * 7 if unit == "week" else count
+    return _intent("provide_info", trip_context, {"duration": str(days)})
+
+
+def _classify_date(text, trip_context):
+    normalized_date = parse_date_locally(text)
+    if not normalized_date:
+        return None
+    # A bare date fills the departure date first; once that is set, it is the return date
+    if not trip_context.get("departure_date"):
+        return _intent("provide_info", trip_context, {"departure_date": normalized_date})
+    if not trip_context.get("return_date"):
+        return _intent("provide_info", trip_context, {"return_date": normalized_date})
+    return None
+
+
+def _classify_city(user_input, text, trip_context):
+    if text not in KNOWN_CITIES:
+        return None
+    city = user_input.strip().rstrip("!?.,")
+    if not trip_context.get("destination"):
+        return _intent("provide_info", trip_context, {"destination": city})
+    if not trip_context.get("origin"):
+        return _intent("provide_info", trip_context, {"origin": city})
+    return None
@@ -0,0 +1,162 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter
+from ttl_cache import TTLCache, SQLiteStore
+
+# Generated itineraries and tips are reused for this long
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL", 14 * 24 * 3600))
+# Entries kept in memory, and rows kept in the on-disk table
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2048))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", 20000))
+# Set LLM_CACHE=0 to always call Gemini
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+# Set LLM_CACHE_SIMILARITY=1 to also reuse replies whose interests are worded differently
+# but mean nearly the same ("museums, food" vs "art museums and local food")
+SIMILARITY_ENABLED = os.getenv("LLM_CACHE_SIMILARITY", "0") == "1"
+SIMILARITY_THRESHOLD = float(os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD", 0.7))
+EMBEDDING_DIMENSIONS = 512
+
+STOPWORDS = {
+    "a", "an", "and", "or", "the", "i", "we", "my", "our", "me", "to", "of", "in", "on", "for",
+    "with", "some", "also", "like", "love", "enjoy", "want", "into", "really", "very", "lots", "lot"
+}
+
+response_cache = TTLCache(
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    store=SQLiteStore("llm_responses")
+)
+response_cache.store.purge_expired()
+response_cache.store.trim(LLM_CACHE_MAX_ROWS)
+
+# Interest embeddings of the cached replies, by the rest of their key; filled lazily from disk
+_similarity_index = {}
+_index_lock = threading.Lock()
+# Lookups answered exactly, by a similar entry, or not at all
+_lookups = Counter()
+
+
+def normalize_place(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+
+def interest_terms(interests):
+    """'Museums and food!' and 'food, museum' both become ['food', 'museum']"""
+    terms = set()
+    for word in re.findall(r"[a-z0-9]+", str(interests).lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.add(word)
+    return sorted(terms)
+
+
+def normalize_duration(duration):
+    match = re.search(r"\d+", str(duration))
+    return match.group() if match else ""
+
+
+def cache_key(kind, version, destination, duration="", interests=""):
+    return "|".join((
+        f"{kind}:v{version}", normalize_place(destination), normalize_duration(duration),
+        " ".join(interest_terms(interests))
+    ))
+
+
+def embed_interests(terms):
+    """
+    Local embedding of interest terms: words and their character trigrams hashed into
+    a fixed-size vector, so related wordings ("museum", "art museums") land close together.
+    """
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for term in terms:
+        features = [term] + [f"#{term}#"[i:i + 3] for i in range(len(term))]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % EMBEDDING_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+
+def cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+def _bucket(key):
+    """The key without its interests part; only replies in the same bucket are compared"""
+    return key.rsplit("|", 1)[0]
+
+
+def _bucket_index(bucket):
+    with _index_lock:
+        index = _similarity_index.get(bucket)
+        if index is None:
+            index = {
+                key: embed_interests(key.rsplit("|", 1)[1].split())
+                for key in response_cache.store.keys(prefix=bucket + "|")
+            }
+            _similarity_index[bucket] = index
+        return index
+
+
+def cached_reply(kind, version, destination, duration="", interests=""):
+    """The cached reply for this request, or one for similar interests if enabled; None on a miss"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    key = cache_key(kind, version, destination, duration, interests)
+    reply = response_cache.get(key)
+    if reply is not None:
+        _count("exact")
+        return reply
+    if not SIMILARITY_ENABLED:
+        _count("miss")
+        return None
+
+    query = embed_interests(key.rsplit("|", 1)[1].split())
+    candidates = sorted(
+        ((cosine(query, vector), other) for other, vector in list(_bucket_index(_bucket(key)).items())),
+        reverse=True
+    )
+    for score, other in candidates:
+        if score < SIMILARITY_THRESHOLD:
+            break
+        reply = response_cache.get(other)
+        if reply is not None:
+            _count("similar")
+            print(f"[LLM cache] Reusing '{other}' for '{key}' (similarity {score:.2f})")
+            return reply
+    _count("miss")
+    return None
+
+
+def _count(outcome):
+    with _index_lock:
+        _lookups[outcome] += 1
+
+
+def cache_reply(kind, version, destination, reply, duration="", interests=""):
+    if not LLM_CACHE_ENABLED or not reply:
+        return
+    key = cache_key(kind, version, destination, duration, interests)
+    response_cache.set(key, reply)
+    if SIMILARITY_ENABLED:
+        index = _bucket_index(_bucket(key))
+        with _index_lock:
+            index[key] = embed_interests(key.rsplit("|", 1)[1].split())
+
+
+def llm_cache_stats():
+    with _index_lock:
+        exact, similar, misses = _lookups["exact"], _lookups["similar"], _lookups["miss"]
+    total = exact + similar + misses
+    return {
+        "exact_hits": exact,
+        "similar_hits": similar,
+        "misses": misses,
+        "hit_rate": round((exact + similar) / total, 3) if total else 0.0,
+        "size": response_cache.stats()["size"]
+    }
@@ -0,0 +1,86 @@
+import json
+import re
+
+EXTRACTION_FIELDS = [
+    "origin", "destination", "departure_date", "return_date",
+    "budget", "accommodation", "interests", "duration"
+]
+INTENTS = ["greeting", "reset", "provide_info", "question", "continue"]
+
+
+def parse_llm_json(text):
+    """
+    Parse a JSON object out of a Gemini reply, repairing the usual defects locally:
+    markdown fences, prose around the object, single quotes, Python literals
+    and trailing commas. Raises ValueError if nothing parseable remains.
+    """
+    cleaned = text.replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        pass
+
+    # Keep only the outermost {...} block
+    start, end = cleaned.find("{"), cleaned.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError(f"No JSON object in response: {text!r}")
+    repaired = cleaned[start:end + 1]
+    repaired = re.sub(r"\bTrue\b", "true", repaired)
+    repaired = re.sub(r"\bFalse\b", "false", repaired)
+    repaired = re.sub(r"\bNone\b", "null", repaired)
+    repaired = re.sub(r",\s*([}\]])", r"\1", repaired)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError:
+        pass
+
+    # Single-quoted keys and strings, leaving apostrophes inside words alone
+    repaired = re.sub(r"(?<![A-Za-z])'|'(?![A-Za-z])", '"', repaired)
+    try:
+        return json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Unrepairable JSON in response: {text!r}") from e
+
+
+def validate_intent(data):
+    """
+    Coerce an intent reply into {"intent": str, "is_greeting": bool, "is_reset": bool,
+    "extracted_info": {field: str}, "missing_info": [str], "next_question": str}.
+    Raises ValueError when the intent is unknown or extracted_info is not an object;
+    unknown fields and empty values are dropped.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(data).__name__}")
+    intent = str(data.get("intent") or "").strip().lower()
+    if intent not in INTENTS:
+        raise ValueError(f"Unknown intent: {data.get('intent')!r}")
+    extracted_info = data.get("extracted_info")
+    if extracted_info is None:
+        extracted_info = {}
+    if not isinstance(extracted_info, dict):
+        raise ValueError(f"Expected extracted_info to be an object, got {type(extracted_info).__name__}")
+
+    clean_fields = {}
+    for key in EXTRACTION_FIELDS:
+        value = extracted_info.get(key)
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        value = str(value).strip()
+        if value and value.lower() not in ["null", "none", "n/a", "unknown"]:
+            clean_fields[key] = value
+
+    missing_info = data.get("missing_info")
+    return {
+        "intent": intent,
+        "is_greeting": _as_bool(data.get("is_greeting")) or intent == "greeting",
+        "is_reset": _as_bool(data.get("is_reset")) or intent == "reset",
+        "extracted_info": clean_fields,
+        "missing_info": [str(item) for item in missing_info] if isinstance(missing_info, list) else [],
+        "next_question": str(data.get("next_question") or "")
+    }
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ["true", "yes", "1"]
+    return bool(value)
@@ -0,0 +1,57 @@
+from typing import NamedTuple, Optional
+
+# Compact result records returned by the API clients. Rendering to chat text or HTML happens
+# once, in render.py; failures travel in `error` instead of being mixed into the results.
+
+
+class FlightOffer(NamedTuple):
+    airline: str
+    price: str
+    duration: str
+    departs_at: str
+    departs_from: str
+    arrives_at: str
+    arrives_to: str
+    link: str
+
+
+class FlightSearch(NamedTuple):
+    origin: str
+    destination: str
+    date: str
+    offers: tuple = ()
+    error: Optional[str] = None
+
+
+class HotelOffer(NamedTuple):
+    name: str
+    stars: object
+    price: object
+    currency: str
+    link: str
+
+
+class HotelSearch(NamedTuple):
+    city: str
+    check_in: str
+    check_out: str
+    offers: tuple = ()
+    error: Optional[str] = None
+
+
+class DayForecast(NamedTuple):
+    location: str
+    date: str
+    description: str
+    tempmax: Optional[float]
+    tempmin: Optional[float]
+    precip: Optional[float]
+
+
+def as_plain(value):
+    """Records (and lists of them) as plain dicts and lists, e.g. for json.dumps"""
+    if hasattr(value, "_asdict"):
+        return {key: as_plain(item) for key, item in value._asdict().items()}
+    if isinstance(value, (list, tuple)):
+        return [as_plain(item) for item in value]
+    return value
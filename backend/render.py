@@ -0,0 +1,64 @@
+from records import FlightSearch, HotelSearch
+
+# Chat text and HTML for the records in records.py. Each offer renders to a list of lines,
+# joined with newlines for chat replies and with <br> for the HTML sections.
+
+
+def flight_offer_lines(offer, index):
+    return [
+        f"{index}. {offer.airline} – ${offer.price}",
+        f"   🕐 Duration: {offer.duration}",
+        f"   🛫 Departs: {offer.departs_at} from {offer.departs_from}",
+        f"   🛬 Arrives: {offer.arrives_at} at {offer.arrives_to}",
+        f"   🔗 [Book here]({offer.link})"
+    ]
+
+
+def flight_lines(search: FlightSearch):
+    """A flight search as chat lines: a header and one entry per offer, or a single ❌ line"""
+    if search.error:
+        return [f"❌ {search.error}"]
+    if not search.offers:
+        return [f"❌ No flights found from {search.origin} to {search.destination} on {search.date}"]
+    header = f"✈️ Flight Options ({search.origin} → {search.destination} on {search.date}):\n\n"
+    return [header] + ["\n".join(flight_offer_lines(offer, i)) for i, offer in enumerate(search.offers, start=1)]
+
+
+def hotel_offer_lines(offer, index):
+    return [
+        f"{index}. {offer.name} ({offer.stars} stars) - {offer.price} {offer.currency}",
+        f"Link: {offer.link}"
+    ]
+
+
+def hotel_lines(search: HotelSearch):
+    return ["\n".join(hotel_offer_lines(offer, i)) for i, offer in enumerate(search.offers, start=1)]
+
+
+def forecast_text(forecast):
+    return (
+        f"📍 Weather Forecast for {forecast.location} on {forecast.date}:\n"
+        f"- Description: {forecast.description}\n"
+        f"- Max Temperature: {forecast.tempmax} °C\n"
+        f"- Min Temperature: {forecast.tempmin} °C\n"
+        f"- Precipitation: {forecast.precip} mm\n"
+    )
+
+
+def flights_html(search: FlightSearch):
+    html = '<span>✈️ <strong>Flight Options</strong></span><ul>'
+    if search.offers:
+        for i, offer in enumerate(search.offers, start=1):
+            html += "<li>" + "<br>".join(flight_offer_lines(offer, i)) + "</li>"
+    else:
+        html += "<li>" + flight_lines(search)[0] + "</li>"
+    html += "</ul>"
+    return html
+
+
+def hotels_html(search: HotelSearch):
+    html = '<span>🏨 <strong>Hotel Options</strong></span><ul>'
+    for i, offer in enumerate(search.offers, start=1):
+        html += "<li>" + "<br>".join(hotel_offer_lines(offer, i)) + "</li>"
+    html += "</ul>"
+    return html
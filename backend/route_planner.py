@@ -0,0 +1,299 @@
+import csv
+import os
+from functools import lru_cache
+from airports import DATA_DIR, load_airports, airports_for, get_airport, lookup_city_code
+from spatial_index import GridIndex, haversine_km
+
+ROUTES_FILE = os.path.join(DATA_DIR, "routes.csv")
+POI_FILE = os.path.join(DATA_DIR, "points_of_interest.csv")
+
+# Airports this close to the origin or destination count as alternatives to it
+NEARBY_RADIUS_KM = 150
+# Parks and other places without an airport are served from further away
+POI_RADIUS_KM = 250
+# Airports with at least this many routes in the bundled graph are treated as hubs
+HUB_MIN_ROUTES = 40
+# Ranking weights: a connection is worth this much extra flying, and road km count more than air km
+CONNECTION_PENALTY_KM = 500
+GROUND_KM_WEIGHT = 2
+# Ranking penalty for smaller airports (fewer flights, pricier fares), in km of extra distance
+SIZE_PENALTY_KM = {"large": 0, "medium": 20, "small": 40}
+# Drive time estimate: roads are longer than the great circle, at a typical mixed-road speed
+ROAD_WINDING_FACTOR = 1.3
+AVERAGE_DRIVE_KMH = 75
+# How many candidate routes to hand to the flight probe
+ROUTE_CANDIDATES = int(os.getenv("ROUTE_CANDIDATES", 8))
+
+COUNTRY_REGIONS = {
+    "US": "US",
+    "GB": "EU", "IE": "EU", "FR": "EU", "DE": "EU", "NL": "EU", "BE": "EU", "CH": "EU",
+    "AT": "EU", "CZ": "EU", "HU": "EU", "PL": "EU", "DK": "EU", "SE": "EU", "NO": "EU",
+    "FI": "EU", "IS": "EU", "ES": "EU", "PT": "EU", "IT": "EU", "GR": "EU",
+    "CN": "ASIA", "HK": "ASIA", "MO": "ASIA", "TW": "ASIA", "JP": "ASIA", "KR": "ASIA",
+    "IN": "ASIA", "TH": "ASIA", "SG": "ASIA", "MY": "ASIA", "ID": "ASIA", "PH": "ASIA", "VN": "ASIA",
+    "AE": "MIDDLE_EAST", "QA": "MIDDLE_EAST", "SA": "MIDDLE_EAST", "IL": "MIDDLE_EAST",
+    "EG": "MIDDLE_EAST", "TR": "MIDDLE_EAST"
+}
+
+
+@lru_cache(maxsize=1)
+def load_routes():
+    """Undirected route graph from the bundled dataset: IATA code -> codes served nonstop"""
+    airports = load_airports()
+    graph = {}
+    with open(ROUTES_FILE, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            origin = row["origin"]
+            for destination in row["destinations"].split():
+                if origin not in airports or destination not in airports or origin == destination:
+                    continue
+                graph.setdefault(origin, set()).add(destination)
+                graph.setdefault(destination, set()).add(origin)
+    return {code: frozenset(neighbours) for code, neighbours in graph.items()}
+
+
+@lru_cache(maxsize=1)
+def load_points_of_interest():
+    """
+    Bundled places without their own airport, keyed by lower-cased name.
+    Park entrances are attached to their park under "entrances".
+    """
+    places = {}
+    entrances = []
+    with open(POI_FILE, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            row["latitude"] = float(row["latitude"])
+            row["longitude"] = float(row["longitude"])
+            if row["part_of"]:
+                entrances.append(row)
+            else:
+                row["entrances"] = []
+                places[row["name"].lower()] = row
+    for entrance in entrances:
+        places[entrance["part_of"].lower()]["entrances"].append(entrance)
+    return places
+
+
+def find_point_of_interest(name):
+    """Match 'Yellowstone', 'yellowstone np' or 'Yellowstone National Park' to a bundled place"""
+    key = name.lower().replace("national park", "").replace(" np", "").strip()
+    if not key:
+        return None
+    for place_name, place in load_points_of_interest().items():
+        if place_name == name.lower().strip() or place_name.replace("national park", "").strip() == key:
+            return place
+    return None
+
+
+def airport_distance_km(code_a, code_b):
+    a, b = get_airport(code_a), get_airport(code_b)
+    return haversine_km(a["latitude"], a["longitude"], b["latitude"], b["longitude"])
+
+
+@lru_cache(maxsize=1)
+def airport_index():
+    """Spatial index over the airports that have routes in the bundled graph"""
+    routes = load_routes()
+    return GridIndex(
+        (code, airport["latitude"], airport["longitude"])
+        for code, airport in load_airports().items() if code in routes
+    )
+
+
+def nearest_airports(latitude, longitude, radius_km=NEARBY_RADIUS_KM, exclude=()):
+    """[(code, km)] for airports with known routes within `radius_km`, nearest first"""
+    return [(code, km) for code, km in airport_index().within(latitude, longitude, radius_km) if code not in exclude]
+
+
+def estimate_drive_minutes(km):
+    return round(km * ROAD_WINDING_FACTOR / AVERAGE_DRIVE_KMH * 60)
+
+
+def format_drive_time(minutes):
+    if minutes < 60:
+        return f"{max(minutes, 5)}-minute drive"
+    return f"{round(minutes / 60 * 2) / 2:g}-hour drive"
+
+
+def airports_near(latitude, longitude, radius_km=NEARBY_RADIUS_KM, country=None):
+    """
+    Airports within `radius_km`, ranked by distance with a penalty for smaller airports,
+    as dicts with code, km, size and an estimated drive time in minutes.
+    Airports in another country are skipped when `country` is given, since the drive would cross a border or sea.
+    """
+    airports = load_airports()
+    found = []
+    for code, km in airport_index().within(latitude, longitude, radius_km):
+        airport = airports[code]
+        if country and airport["country"] != country:
+            continue
+        found.append({
+            "code": code,
+            "km": km,
+            "size": airport["size"],
+            "drive_minutes": estimate_drive_minutes(km)
+        })
+    return sorted(found, key=lambda item: item["km"] + SIZE_PENALTY_KM.get(item["size"], 0))
+
+
+def place_access_points(place):
+    """The park's entrances if it has any, otherwise the place itself"""
+    return place["entrances"] or [place]
+
+
+def place_airports(place, radius_km=POI_RADIUS_KM):
+    """Airports serving a bundled place, measured to the nearest of its entrances, best first"""
+    best = {}
+    for point in place_access_points(place):
+        for airport in airports_near(point["latitude"], point["longitude"], radius_km, place["country"]):
+            if airport["code"] not in best or airport["km"] < best[airport["code"]]["km"]:
+                best[airport["code"]] = airport
+    return sorted(best.values(), key=lambda item: item["km"] + SIZE_PENALTY_KM.get(item["size"], 0))
+
+
+def get_ground_transportation(airport_code, destination):
+    """Estimated drive from an airport to a park entrance, a bundled place or a city's main airport"""
+    airport = get_airport(airport_code)
+    if not airport:
+        return "Ground transportation available"
+
+    place = find_point_of_interest(destination)
+    if place:
+        point, km = min(
+            ((point, haversine_km(airport["latitude"], airport["longitude"], point["latitude"], point["longitude"]))
+             for point in place_access_points(place)),
+            key=lambda item: item[1]
+        )
+        target = f"{place['name']}'s {point['name']}" if point is not place else place["name"]
+    else:
+        code = lookup_city_code(destination) or destination
+        primary = [a for a in airports_for(code) if a["iata"] != airport["iata"]]
+        if not primary:
+            return "Ground transportation available"
+        km = min(haversine_km(airport["latitude"], airport["longitude"], a["latitude"], a["longitude"]) for a in primary)
+        target = destination
+
+    return f"About a {format_drive_time(estimate_drive_minutes(km))} ({km * ROAD_WINDING_FACTOR:.0f} km) to {target}"
+
+
+@lru_cache(maxsize=1)
+def hubs():
+    routes = load_routes()
+    return frozenset(code for code, neighbours in routes.items() if len(neighbours) >= HUB_MIN_ROUTES)
+
+
+def get_nearby_airports(airport_code):
+    """Other airports with scheduled service within NEARBY_RADIUS_KM of `airport_code`"""
+    airport = get_airport(airport_code)
+    if not airport:
+        return []
+    return [code for code, _ in nearest_airports(airport["latitude"], airport["longitude"], exclude={airport["iata"]})]
+
+
+def get_region(airport_code):
+    airport = get_airport(airport_code)
+    if not airport:
+        return "OTHER"
+    return COUNTRY_REGIONS.get(airport["country"], "OTHER")
+
+
+def get_special_destination_airports(destination):
+    """Airports serving a national park or similar place, nearest first"""
+    place = find_point_of_interest(destination)
+    if not place:
+        return []
+    return [airport["code"] for airport in place_airports(place)]
+
+
+def endpoint_airports(place):
+    """
+    Airports that can serve as one end of a trip, as (code, ground_km, is_primary).
+    Primary airports belong to the place itself; the others are nearby alternatives.
+    """
+    routes = load_routes()
+    poi = find_point_of_interest(place)
+    if poi:
+        return [(airport["code"], airport["km"], False) for airport in place_airports(poi)]
+
+    primary = [airport for airport in airports_for(place) if airport["iata"] in routes]
+    endpoints = [(airport["iata"], 0.0, True) for airport in primary]
+    seen = {code for code, _, _ in endpoints}
+    for airport in primary:
+        for code, km in nearest_airports(airport["latitude"], airport["longitude"], exclude=seen):
+            endpoints.append((code, km, False))
+            seen.add(code)
+    return endpoints
+
+
+def airport_label(code):
+    airport = get_airport(code)
+    return f"{airport['name']} ({code})" if airport else code
+
+
+def candidate_routes(origin, destination, k=ROUTE_CANDIDATES):
+    """
+    The k cheapest alternative routes between two places (city/airport codes or
+    bundled place names), in the route dicts get_alternative_flights expects.
+    Paths have at most one connection, which is all the flight probe can search,
+    and are ranked by air distance plus weighted road distance plus a connection penalty.
+    """
+    routes = load_routes()
+    hub_codes = hubs()
+    origins = endpoint_airports(origin)
+    destinations = endpoint_airports(destination)
+    candidates = []
+
+    for o, o_km, o_primary in origins:
+        for d, d_km, d_primary in destinations:
+            if o == d:
+                continue
+            ground_cost = (o_km + d_km) * GROUND_KM_WEIGHT
+            flown = airport_distance_km(o, d)
+
+            # The city-to-city search already failed, so only airport swaps on one side are new
+            if d in routes[o] and o_primary != d_primary:
+                if o_primary:
+                    candidates.append((flown + ground_cost, {
+                        "type": "nearby_dest",
+                        "origin": o,
+                        "destination": d,
+                        "reasoning": f"{airport_label(d)} is {d_km:.0f} km from {destination} and has nonstop service from {o}.",
+                        "ground_transportation": get_ground_transportation(d, destination)
+                    }))
+                else:
+                    candidates.append((flown + ground_cost, {
+                        "type": "nearby_origin",
+                        "origin": o,
+                        "destination": d,
+                        "reasoning": f"{airport_label(o)} is {o_km:.0f} km from {origin} and has nonstop service to {d}."
+                    }))
+
+            if not o_primary:
+                continue
+            for hub in (routes[o] & routes[d] & hub_codes) - {o, d}:
+                hub_flown = airport_distance_km(o, hub) + airport_distance_km(hub, d)
+                route = {
+                    "type": "hub_connection",
+                    "origin": o,
+                    "destination": d,
+                    "hub": hub,
+                    "reasoning": f"Connect through {airport_label(hub)}, a hub with {len(routes[hub])} routes in our data."
+                }
+                if not d_primary:
+                    route["reasoning"] = route["reasoning"][:-1] + f", then fly to {d}, {d_km:.0f} km from {destination}."
+                    route["ground_transportation"] = get_ground_transportation(d, destination)
+                candidates.append((hub_flown + CONNECTION_PENALTY_KM + ground_cost, route))
+
+    # Sibling airports (JFK/LGA/EWR) would otherwise fill the list with the same option,
+    # so keep only the cheapest route per alternative airport or hub
+    candidates.sort(key=lambda item: item[0])
+    chosen = {}
+    for _, route in candidates:
+        if route["type"] == "nearby_origin":
+            key = ("nearby_origin", route["origin"])
+        else:
+            key = (route["type"], route.get("hub"), route["destination"])
+        chosen.setdefault(key, route)
+        if len(chosen) == k:
+            break
+    return list(chosen.values())
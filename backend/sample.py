@@ -2,55 +2,60 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta
 import re
-from amadeus import Client, ResponseError
-from amadeus_api import get_flight_prices_with_links, resolve_city_to_code
-from hotel_api import get_hotel_prices_with_links
-from weather_api import get_weather_climatology
-import google.generativeai as genai
-from dateutil import parser
+from amadeus_api import search_flights, resolve_city_to_code
+from hotel_api import search_hotels
+from weather_api import get_weather_range
+from records import as_plain
+from render import flight_lines, hotel_lines, forecast_text, flights_html, hotels_html
 import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from session_manager import SessionManager, ChatSession
+from turn_memo import TurnMemo
+from date_parser import parse_date_locally
+from intent_classifier import classify_intent_locally, classifier_stats, RESET_PHRASES
+from llm_json import parse_llm_json, validate_intent
+from llm_cache import cached_reply, cache_reply
+from clients import gemini_model, warm_up
+from chat_history import compact_history, estimate_tokens, history_tokens, record_prompt, start_turn_metrics, turn_metrics_summary
+from route_planner import (
+    ROUTE_CANDIDATES, candidate_routes, endpoint_airports, find_point_of_interest, get_ground_transportation
+)
 
 # Load environment variables
 load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-
-# Trip context memory
-trip_context = {
-    "origin": "",
-    "destination": "",
-    "departure_date": "",
-    "return_date": "",
-    "interests": "",
-    "duration": ""
+
+# Session used by the command-line chatbot; API callers always have their own
+DEFAULT_SESSION_ID = "default"
+
+# Stage 4 fetches its independent sources on this pool; each source has its own timeout in seconds
+plan_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PLAN_WORKERS", 64)), thread_name_prefix="plan")
+PLAN_SOURCE_TIMEOUTS = {
+    "flights": 30,
+    "hotels": 20,
+    "weather": 10,
+    "itinerary": 45
 }
 
-# Set up Gemini model
-model = genai.GenerativeModel("models/gemini-1.5-flash-latest")
-chat = model.start_chat()
+# Alternative-route search: legs probed at once per request, and how many viable options are enough
+ROUTE_PROBE_CONCURRENCY = int(os.getenv("ROUTE_PROBE_CONCURRENCY", 4))
+MAX_ALTERNATIVE_OPTIONS = int(os.getenv("MAX_ALTERNATIVE_OPTIONS", 3))
+# Routes are planned locally; set to 1 to have Gemini reword the reasoning of the options shown
+ROUTE_PROSE_LLM = os.getenv("ROUTE_PROSE_LLM", "0") == "1"
+ROUTE_TYPES = ["direct", "nearby_origin", "nearby_dest", "hub_connection"]
 
-def normalize_date(date_str):
-    """Use Gemini to normalize any date format into YYYY-MM-DD"""
-    try:
-        prompt = (
-            "Convert this date to YYYY-MM-DD format. "
-            "If the year is not specified, use 2025. "
-            "If the date is ambiguous or invalid, return 'invalid'. "
-            "For seasons like 'summer', use the start of that season in 2025. "
-            "Handle abbreviated months (e.g., 'aug' for August, 'jan' for January). "
-            "Handle various date formats like '28 aug', 'aug 28', '28th august', etc. "
-            "Return ONLY the date in YYYY-MM-DD format, nothing else. "
-            f"Date to normalize: {date_str}"
-        )
-        response = chat.send_message(prompt)
-        normalized_date = response.text.strip()
-        print(f"Gemini normalized '{date_str}' to '{normalized_date}'")
-        return normalized_date
-    except Exception as e:
-        print(f"Error in normalize_date: {str(e)}")
-        return "invalid"
+# Bump a prompt's version when its wording changes, so replies cached for the old prompt are not reused
+PROMPT_VERSIONS = {
+    "itinerary": 1,
+    "itinerary_html": 1,
+    "tips_html": 1
+}
+
+GREETING = "Hi! I'm your travel planning assistant. I'd love to help you plan your perfect trip. Where would you like to go?"
 
-def initialize_chat():
-    instruction = (
+def build_instruction():
+    return (
         "You are a friendly and knowledgeable travel planning assistant. Your goal is to help users plan their trips "
         "through natural conversation. Follow these guidelines:\n"
         "1. Engage in natural, conversational dialogue\n"
@@ -70,10 +75,72 @@ def initialize_chat():
         "duration: [number only]"
         "}"
     )
-    chat.send_message(instruction)
-    return "Hi! I'm your travel planning assistant. I'd love to help you plan your perfect trip. Where would you like to go?"
 
-def generate_itinerary(destination, duration, interests=""):
+def new_chat():
+    """Start a Gemini chat that already carries the assistant instructions"""
+    return gemini_model().start_chat(history=[
+        {"role": "user", "parts": [build_instruction()]},
+        {"role": "model", "parts": [GREETING]}
+    ])
+
+# Per-user conversations: each session owns its chat handle and trip context
+sessions = SessionManager(new_chat)
+
+def ask_stateless(session, prompt):
+    """Send a utility prompt (classification, extraction, routing) without any chat history"""
+    record_prompt(session, "stateless", estimate_tokens(prompt))
+    return gemini_model().generate_content(prompt)
+
+def emit_to(on_event, event_type, **data):
+    """Pass partial output to a turn's streaming listener, if it has one"""
+    if on_event:
+        on_event({"type": event_type, **data})
+
+def emit(session, event_type, **data):
+    emit_to(session.on_event, event_type, **data)
+
+def send_in_conversation(session, prompt, stream=False):
+    """
+    Send a user-facing prompt through the session chat, keeping its history within budget.
+    With `stream`, text chunks are emitted as "token" events while Gemini generates them.
+    """
+    record_prompt(session, "chat", history_tokens(session.chat.history) + estimate_tokens(prompt))
+    if stream and session.on_event:
+        response = session.chat.send_message(prompt, stream=True)
+        for chunk in response:
+            emit(session, "token", text=chunk.text)
+    else:
+        response = session.chat.send_message(prompt)
+    compact_history(session.chat)
+    return response
+
+def generate_cached(session, kind, prompt, destination, duration="", interests="", stream=False):
+    """
+    Reply to a generation prompt from the LLM cache when the same (or, if enabled, a similar)
+    request was answered before; otherwise ask Gemini and cache the reply.
+    """
+    reply = cached_reply(kind, PROMPT_VERSIONS[kind], destination, duration, interests)
+    if reply is not None:
+        # Keep the chat history as if Gemini had answered, so follow-up questions still see the reply
+        session.chat.history = list(session.chat.history) + [
+            {"role": "user", "parts": [prompt]},
+            {"role": "model", "parts": [reply]}
+        ]
+        compact_history(session.chat)
+        return reply
+    reply = send_in_conversation(session, prompt, stream).text
+    cache_reply(kind, PROMPT_VERSIONS[kind], destination, reply, duration, interests)
+    return reply
+
+def initialize_chat(session_id=DEFAULT_SESSION_ID):
+    sessions.get(session_id)
+    return GREETING
+
+def warm_up_chat():
+    """Build the Gemini and Amadeus clients ahead of the first request"""
+    return warm_up()
+
+def generate_itinerary(session, destination, duration, interests=""):
     prompt = (
         f"Create a detailed {duration}-day itinerary for {destination}. "
         f"Break it down day by day, starting each day with 'Day X:' (e.g., 'Day 1:'). "
@@ -81,10 +148,9 @@ def generate_itinerary(destination, duration, interests=""):
         f"Consider these interests: {interests}. "
         "Include major attractions, local experiences, and dining recommendations."
     )
-    response = chat.send_message(prompt)
-    return response.text
+    return generate_cached(session, "itinerary", prompt, destination, duration, interests)
 
-def generate_itinerary_html(destination, duration, interests=""):
+def generate_itinerary_html(session, destination, duration, interests=""):
     prompt = (
         f"Create a detailed {duration}-day itinerary for {destination}. "
         f"Break it down day by day. For each day, start with an emoji and a bolded title, e.g., 'Day 1: City Name'. "
@@ -96,30 +162,18 @@ def generate_itinerary_html(destination, duration, interests=""):
         f"Consider these interests: {interests}. "
         "Include major attractions, local experiences, and dining recommendations."
     )
-    response = chat.send_message(prompt)
-    return response.text
+    return generate_cached(session, "itinerary_html", prompt, destination, duration, interests, stream=True)
 
 def strip_code_blocks(text):
     return re.sub(r"^```html|^```|```$", "", text.strip(), flags=re.MULTILINE).strip()
 
 def generate_flights_html(origin, destination, date):
-    flights = get_flight_prices_with_links(origin, destination, date)
-    html = '<span>✈️ <strong>Flight Options</strong></span><ul>'
-    for flight in flights:
-        html += "<li>" + f"<br>".join(flight.split('\n')) + "</li>"
-    html += "</ul>"
-    return html
+    return flights_html(search_flights(origin, destination, date))
 
 def generate_hotels_html(destination, checkin, checkout):
-    hotels = get_hotel_prices_with_links(destination, checkin, checkout)
-    print(hotels)
-    html = '<span>🏨 <strong>Hotel Options</strong></span><ul>'
-    for hotel in hotels:
-        html += "<li>" + "<br>".join(hotel.split('\n')) + "</li>"
-    html += "</ul>"
-    return html
-
-def generate_tips_html(destination):
+    return hotels_html(search_hotels(destination, checkin, checkout))
+
+def generate_tips_html(session, destination):
     prompt = (
         f"Give travel tips for {destination}. "
         "Start with an emoji and a bolded title for each section. "
@@ -129,159 +183,7 @@ def generate_tips_html(destination):
         "Do NOT use HTML tags. "
         "Return only the formatted text, no explanations."
     )
-    response = chat.send_message(prompt)
-    return response.text
-
-def is_greeting(text):
-    """Check if the input is a greeting"""
-    greeting_prompt = (
-        "Determine if this is a greeting or introduction (like 'hello', 'hi', 'hey', etc.). "
-        "Return 'yes' if it is, 'no' if it's not. "
-        f"Text to check: {text}"
-    )
-    try:
-        response = chat.send_message(greeting_prompt)
-        return "yes" in response.text.lower()
-    except Exception as e:
-        print(f"Error checking greeting: {str(e)}")
-        return False
-
-def is_valid_city(text):
-    """Check if the input could be a valid city name"""
-    city_prompt = (
-        "Determine if this could be a valid city name. "
-        "Return 'yes' if it could be a city name, 'no' if it's definitely not. "
-        "Consider common city names, but also allow for less common ones. "
-        "Return 'no' for greetings, numbers, or clearly non-city words. "
-        f"Text to check: {text}"
-    )
-    try:
-        response = chat.send_message(city_prompt)
-        return "yes" in response.text.lower()
-    except Exception as e:
-        print(f"Error checking city: {str(e)}")
-        return False
-
-def extract_trip_context(user_input):
-    # Initialize context with current values
-    context = trip_context.copy()
-    
-    # Check if this is a greeting
-    if is_greeting(user_input):
-        print("Detected greeting, not updating context")
-        return context
-    
-    # Check if this might be a date
-    if any(month in user_input.lower() for month in ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']):
-        print(f"Detected potential date input: {user_input}")
-        normalized_date = normalize_date(user_input)
-        if normalized_date != "invalid":
-            # If we already have a departure date, this must be the return date
-            if context["departure_date"]:
-                context["return_date"] = normalized_date
-                print(f"Updated return_date to {normalized_date}")
-            else:
-                context["departure_date"] = normalized_date
-                print(f"Updated departure_date to {normalized_date}")
-            return context
-    
-    # Use Gemini to extract information from user input
-    extraction_prompt = (
-        "Extract travel planning information from the user's message. "
-        "Return a JSON object with the following fields if found: "
-        "origin, destination, departure_date, return_date, budget, accommodation, interests, duration. "
-        "Only include fields that are explicitly mentioned or can be reasonably inferred. "
-        "For dates, understand natural language expressions like 'next week', 'in 2 months', 'end of summer', etc. "
-        "Also handle various date formats like '28 aug', 'aug 28', '28th august', etc. "
-        "Convert all dates to YYYY-MM-DD format. "
-        "For budget, extract the numerical value. "
-        "For duration, extract only the number. "
-        "If a field is not mentioned, do not include it in the response. "
-        "Format the response as a valid JSON object without any markdown formatting. "
-        "If the message is just 'correct' or similar acknowledgment, return an empty JSON object. "
-        "IMPORTANT: If the message is a single word or short phrase that could be a city name, and we already have a destination but no origin, treat it as the origin city. "
-        f"User message: {user_input}"
-    )
-    
-    try:
-        response = chat.send_message(extraction_prompt)
-        extracted_data = response.text.strip()
-        print(f"Extracted data: {extracted_data}")
-        
-        # Remove any markdown formatting
-        extracted_data = extracted_data.replace('```json', '').replace('```', '').strip()
-        
-        # Parse the JSON response
-        try:
-            data = json.loads(extracted_data)
-            print(f"Parsed JSON data: {data}")
-            
-            # If the input is a single word or short phrase, check if it could be a city
-            if not data and len(user_input.split()) <= 2:
-                if is_valid_city(user_input):
-                    # If we have a destination but no origin, treat this as origin
-                    if context["destination"] and not context["origin"]:
-                        data = {"origin": user_input.strip()}
-                        print(f"Treated '{user_input}' as origin city")
-                    # If we have no destination, treat this as destination
-                    elif not context["destination"]:
-                        data = {"destination": user_input.strip()}
-                        print(f"Treated '{user_input}' as destination city")
-                    else:
-                        print(f"'{user_input}' could be a city but context is unclear")
-            
-            # Update context with extracted values
-            for key in context:
-                if key in data and data[key]:
-                    if key == 'duration':
-                        # Ensure duration is a string number
-                        if str(data[key]).isdigit():
-                            context[key] = str(data[key])
-                            print(f"Updated {key} to {data[key]}")
-                    elif key in ['departure_date', 'return_date']:
-                        # Normalize dates
-                        normalized_date = normalize_date(data[key])
-                        if normalized_date != "invalid":
-                            context[key] = normalized_date
-                            print(f"Updated {key} to {normalized_date}")
-                    else:
-                        context[key] = str(data[key])
-                        print(f"Updated {key} to {data[key]}")
-            
-            # If we have a departure date and duration, calculate return date
-            if context["departure_date"] and context["duration"] and not context["return_date"]:
-                context["return_date"] = calculate_return_date(context["departure_date"], context["duration"])
-                print(f"Calculated return date: {context['return_date']}")
-                
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {extracted_data}")
-            print(f"JSON Error: {str(e)}")
-            # If we can't parse the JSON and input could be a city
-            if len(user_input.split()) <= 2 and is_valid_city(user_input):
-                # If we have a destination but no origin, treat this as origin
-                if context["destination"] and not context["origin"]:
-                    context["origin"] = user_input.strip()
-                    print(f"Treated '{user_input}' as origin city")
-                # If we have no destination, treat this as destination
-                elif not context["destination"]:
-                    context["destination"] = user_input.strip()
-                    print(f"Treated '{user_input}' as destination city")
-            return context
-            
-        return context
-    except Exception as e:
-        print(f"Error extracting context: {str(e)}")
-        # If there's an error and input could be a city
-        if len(user_input.split()) <= 2 and is_valid_city(user_input):
-            # If we have a destination but no origin, treat this as origin
-            if context["destination"] and not context["origin"]:
-                context["origin"] = user_input.strip()
-                print(f"Treated '{user_input}' as origin city")
-            # If we have no destination, treat this as destination
-            elif not context["destination"]:
-                context["destination"] = user_input.strip()
-                print(f"Treated '{user_input}' as destination city")
-        return context
+    return generate_cached(session, "tips_html", prompt, destination)
 
 def calculate_return_date(departure_date, duration):
     try:
@@ -292,7 +194,7 @@ def calculate_return_date(departure_date, duration):
         print(f"Error calculating return date: {str(e)}")
         return ""
 
-def handle_follow_up(user_input):
+def handle_follow_up(session, user_input):
     """Handle follow-up questions and modifications to the travel plan"""
     try:
         # Check if user wants to modify any part of the plan
@@ -301,7 +203,7 @@ def handle_follow_up(user_input):
             "Return 'yes' if they want to change something, 'no' if they're satisfied. "
             f"User message: {user_input}"
         )
-        response = chat.send_message(modification_prompt)
+        response = ask_stateless(session, modification_prompt)
         
         if "yes" in response.text.lower():
             # Ask what they want to modify
@@ -313,10 +215,9 @@ def handle_follow_up(user_input):
     except Exception as e:
         return f"Sorry, I encountered an error: {str(e)}. Please try again."
 
-def reset_trip_context():
+def reset_trip_context(session):
     """Reset all trip context values to empty strings"""
-    global trip_context
-    trip_context = {
+    session.trip_context = {
         "origin": "",
         "destination": "",
         "departure_date": "",
@@ -331,19 +232,19 @@ def reset_trip_context():
 
 def is_reset_request(text):
     """Check if the user wants to reset/start a new trip"""
-    reset_phrases = [
-        "new trip",
-        "start over",
-        "reset",
-        "clear",
-        "plan another trip",
-        "different trip",
-        "let's plan something else"
-    ]
-    return any(phrase in text.lower() for phrase in reset_phrases)
-
-def parse_user_intent(user_input):
+    return any(phrase in text.lower() for phrase in RESET_PHRASES)
+
+def parse_user_intent(session, user_input):
     """Use Gemini to parse user intent and extract relevant information"""
+    trip_context = session.trip_context
+
+    # Greetings, resets, trip lengths, dates and known cities don't need Gemini
+    local_intent = classify_intent_locally(user_input, trip_context)
+    if local_intent:
+        print(f"Parsed user intent locally: {local_intent}")
+        print(f"Intent fast path stats: {classifier_stats()}")
+        return local_intent
+
     prompt = (
         "You are a travel planning assistant. Analyze this user message and return a JSON object with the following structure. "
         "IMPORTANT: Return ONLY the JSON object, no other text or explanation.\n"
@@ -381,31 +282,31 @@ def parse_user_intent(user_input):
     )
     
     try:
-        response = chat.send_message(prompt)
-        response_text = response.text.strip()
-        
-        # Clean up the response to ensure it's valid JSON
-        response_text = response_text.replace('```json', '').replace('```', '').strip()
-        
-        # If the response starts with a newline or whitespace, remove it
-        response_text = response_text.lstrip()
-        
-        # If the response is empty or not valid JSON, return default response
-        if not response_text:
-            raise ValueError("Empty response from Gemini")
-            
-        parsed_data = json.loads(response_text)
+        response = ask_stateless(session, prompt)
+        parsed_data = validate_intent(parse_llm_json(response.text))
         print(f"Parsed user intent: {parsed_data}")
         
-        # Validate the parsed data has all required fields
-        required_fields = ['intent', 'is_greeting', 'is_reset', 'extracted_info', 'missing_info', 'next_question']
-        if not all(field in parsed_data for field in required_fields):
-            raise ValueError("Missing required fields in parsed data")
-            
-        # Maintain existing context for fields that aren't being updated
-        for key in trip_context:
-            if key in parsed_data['extracted_info'] and parsed_data['extracted_info'][key] is None:
-                parsed_data['extracted_info'][key] = trip_context[key]
+        extracted_info = parsed_data["extracted_info"]
+        for key in ["departure_date", "return_date"]:
+            if key not in extracted_info:
+                continue
+            # Gemini was asked for YYYY-MM-DD; only repair the date locally if it didn't comply
+            try:
+                datetime.strptime(extracted_info[key], "%Y-%m-%d")
+            except ValueError:
+                normalized_date = parse_date_locally(extracted_info[key])
+                if normalized_date:
+                    extracted_info[key] = normalized_date
+                else:
+                    print(f"Dropping unparseable {key}: {extracted_info[key]}")
+                    del extracted_info[key]
+        # Durations are a number of days
+        if "duration" in extracted_info:
+            match = re.search(r"\d+", extracted_info["duration"])
+            if match:
+                extracted_info["duration"] = match.group()
+            else:
+                del extracted_info["duration"]
             
         return parsed_data
         
@@ -459,243 +360,208 @@ def parse_user_intent(user_input):
                 "next_question": "Where would you like to go?"
             }
 
-def get_special_destination_airports(destination):
-    """Get nearby airports for special destinations like national parks"""
-    special_destinations = {
-        "yellowstone": ["JAC", "BZN", "COD", "WYS"],  # Jackson Hole, Bozeman, Cody, West Yellowstone
-        "yosemite": ["FAT", "MMH", "RNO"],  # Fresno, Mammoth Lakes, Reno
-        "grand canyon": ["FLG", "GCN", "PHX"],  # Flagstaff, Grand Canyon, Phoenix
-        "glacier": ["FCA", "GPI", "BZN"],  # Kalispell, Glacier Park, Bozeman
-        "zion": ["CDC", "SGU", "LAS"],  # Cedar City, St. George, Las Vegas
-        "rocky mountain": ["DEN", "BJC", "FNL"],  # Denver, Broomfield, Fort Collins
-    }
-    
-    # Convert destination to lowercase and remove common words
-    dest = destination.lower().replace("national park", "").replace("np", "").strip()
-    return special_destinations.get(dest, [])
-
-def get_alternative_routes(origin, destination, date):
-    """Use Gemini to suggest alternative routes and connections"""
-    # First, check if this is a special destination like a national park
-    special_dest_prompt = (
-        "You are a travel routing expert. Analyze this destination and determine if it's a special location "
-        "like a national park, remote area, or tourist destination that might not have its own airport.\n"
-        f"Destination: {destination}\n\n"
-        "Return a JSON object with:\n"
-        "{\n"
-        "  'is_special_destination': boolean,\n"
-        "  'type': 'national_park' | 'remote_area' | 'tourist_destination' | 'regular_city',\n"
-        "  'nearby_airports': [list of relevant airport codes],\n"
-        "  'explanation': 'brief explanation of why this is a special destination'\n"
-        "}\n\n"
-        "For example, for 'Yellowstone National Park', return:\n"
-        "{\n"
-        "  'is_special_destination': true,\n"
-        "  'type': 'national_park',\n"
-        "  'nearby_airports': ['JAC', 'BZN', 'COD', 'WYS'],\n"
-        "  'explanation': 'Yellowstone is a national park with no commercial airport. Nearby airports serve different park entrances.'\n"
-        "}\n\n"
+def get_alternative_routes(session, origin, destination, date):
+    """
+    Candidate alternative routes from the bundled airport and route graph, no Gemini call needed.
+    Places the graph has no airports for are left to Gemini, as before.
+    """
+    def endpoint(place):
+        # Parks and similar places are matched by name; anything else resolves to a city/airport code
+        return place if find_point_of_interest(place) else resolve_city_to_code(place)
+
+    origin_code, dest_code = endpoint(origin), endpoint(destination)
+    unknown = [place for place in (origin_code, dest_code) if not endpoint_airports(place)]
+    if unknown:
+        print(f"No bundled airports for {unknown}, asking Gemini for routes")
+        return suggest_routes(session, origin_code, dest_code, date)
+
+    started = time.perf_counter()
+    routes = candidate_routes(origin_code, dest_code)
+    print(f"Planned {len(routes)} candidate routes in {(time.perf_counter() - started) * 1000:.1f} ms: "
+          f"{[(route['type'], *route_legs(route)) for route in routes]}")
+    return routes
+
+def suggest_routes(session, origin, destination, date):
+    """Gemini's alternative routes for places outside the bundled graph; malformed suggestions are dropped"""
+    prompt = (
+        "You are a travel routing expert. Suggest alternative flight routes for this journey:\n"
+        f"From: {origin}\n"
+        f"To: {destination}\n"
+        f"Date: {date}\n\n"
+        "Consider:\n"
+        "1. Nearby airports for both origin and destination\n"
+        "2. Major hub airports that could serve as connections\n"
+        "3. Common routing patterns for this type of journey\n\n"
+        "Return a JSON object in this format:\n"
+        '{"routes": [\n'
+        "  {\n"
+        '    "type": "direct" | "nearby_origin" | "nearby_dest" | "hub_connection",\n'
+        '    "origin": "airport_code",\n'
+        '    "destination": "airport_code",\n'
+        '    "hub": "airport_code" (only for hub_connection),\n'
+        '    "reasoning": "explanation of why this route makes sense"\n'
+        "  }\n"
+        "]}\n\n"
         "Return ONLY the JSON object, no other text."
     )
-    
     try:
-        special_dest_response = chat.send_message(special_dest_prompt)
-        special_dest_text = special_dest_response.text.strip()
-        special_dest_text = special_dest_text.replace('```json', '').replace('```', '').strip()
-        special_dest_info = json.loads(special_dest_text)
-        print(f"Special destination analysis: {json.dumps(special_dest_info, indent=2)}")
-        
-        # Now get route suggestions based on whether it's a special destination
-        if special_dest_info['is_special_destination']:
-            prompt = (
-                "You are a travel routing expert. Suggest alternative flight routes for this journey:\n"
-                f"From: {origin}\n"
-                f"To: {destination}\n"
-                f"Date: {date}\n\n"
-                f"This is a {special_dest_info['type']} with the following nearby airports: {special_dest_info['nearby_airports']}\n"
-                f"{special_dest_info['explanation']}\n\n"
-                "Return a JSON array of route suggestions in this format:\n"
-                "[\n"
-                "  {\n"
-                "    'type': 'nearby_dest',\n"
-                "    'origin': 'airport_code',\n"
-                "    'destination': 'airport_code',\n"
-                "    'reasoning': 'explanation of why this route makes sense',\n"
-                "    'ground_transportation': 'details about getting to final destination'\n"
-                "  }\n"
-                "]\n\n"
-                "For each nearby airport, explain:\n"
-                "1. Which park entrance it serves\n"
-                "2. Ground transportation options and duration\n"
-                "3. Scenic value of the route\n"
-                "4. Any seasonal considerations\n\n"
-                "Return ONLY the JSON array, no other text."
-            )
-        else:
-            prompt = (
-                "You are a travel routing expert. Suggest alternative flight routes for this journey:\n"
-                f"From: {origin}\n"
-                f"To: {destination}\n"
-                f"Date: {date}\n\n"
-                "Consider:\n"
-                "1. Nearby airports for both origin and destination\n"
-                "2. Major hub airports that could serve as connections\n"
-                "3. Common routing patterns for this type of journey\n\n"
-                "Return a JSON array of route suggestions in this format:\n"
-                "[\n"
-                "  {\n"
-                "    'type': 'direct' | 'nearby_origin' | 'nearby_dest' | 'hub_connection',\n"
-                "    'origin': 'airport_code',\n"
-                "    'destination': 'airport_code',\n"
-                "    'hub': 'airport_code' (only for hub_connection),\n"
-                "    'reasoning': 'explanation of why this route makes sense'\n"
-                "  }\n"
-                "]\n\n"
-                "Return ONLY the JSON array, no other text."
-            )
-        
-        response = chat.send_message(prompt)
-        response_text = response.text.strip()
-        response_text = response_text.replace('```json', '').replace('```', '').strip()
-        routes = json.loads(response_text)
-        print(f"Gemini suggested routes: {json.dumps(routes, indent=2)}")
-        return routes
+        suggested = parse_llm_json(ask_stateless(session, prompt).text).get("routes", [])
     except Exception as e:
         print(f"Error getting alternative routes: {str(e)}")
         return []
+    routes = [route for route in suggested if is_valid_route(route)]
+    print(f"Gemini suggested {len(routes)} usable routes out of {len(suggested)}")
+    return routes[:ROUTE_CANDIDATES]
+
+def is_valid_route(route):
+    """True if a suggested route has a known type and IATA codes for every leg it needs"""
+    if not isinstance(route, dict) or route.get('type') not in ROUTE_TYPES:
+        return False
+    try:
+        legs = route_legs(route)
+    except KeyError:
+        return False
+    return all(isinstance(code, str) and re.fullmatch(r"[A-Z]{3}", code) for leg in legs for code in leg)
+
+def describe_routes(session, options, origin, destination):
+    """Replace the templated reasoning of the chosen options with a short Gemini explanation"""
+    summary = []
+    for option in options:
+        stop = option.get('airport') or option.get('hub') or option.get('destination')
+        summary.append(f"{option['type']} via {stop}: {option['reasoning']}")
+    prompt = (
+        "You are a travel routing expert. For each route option below, write one friendly sentence "
+        f"explaining why it is a good way to travel from {origin} to {destination}.\n"
+        + "\n".join(f"{i + 1}. {line}" for i, line in enumerate(summary)) + "\n\n"
+        'Return ONLY a JSON object like {"reasons": ["...", "..."]} with one entry per option, in order.'
+    )
+    try:
+        reasons = parse_llm_json(ask_stateless(session, prompt).text).get("reasons", [])
+        for option, reason in zip(options, reasons):
+            if isinstance(reason, str) and reason.strip():
+                option['reasoning'] = reason.strip()
+    except Exception as e:
+        print(f"Error describing alternative routes, keeping templated reasoning: {str(e)}")
+
+def route_legs(route):
+    """The (origin, destination) flight searches a suggested route needs"""
+    if route['type'] == 'hub_connection':
+        return [(route['origin'], route['hub']), (route['hub'], route['destination'])]
+    return [(route['origin'], route['destination'])]
+
+def is_viable(search):
+    """True if a flight search returned at least one offer"""
+    return search is not None and bool(search.offers)
 
-def get_alternative_flights(origin, destination, date):
+def probe_route_legs(routes, date, memo):
+    """
+    Search the distinct legs of the suggested routes concurrently, at most
+    ROUTE_PROBE_CONCURRENCY at a time. Legs shared between routes (e.g. a common hub)
+    are searched once. Stops launching probes once MAX_ALTERNATIVE_OPTIONS routes are viable.
+    """
+    legs = []
+    for route in routes:
+        for leg in route_legs(route):
+            if leg not in legs:
+                legs.append(leg)
+    print(f"Probing {len(legs)} distinct legs for {len(routes)} routes")
+
+    results = {}
+    pending = deque(legs)
+    running = {}
+    while pending or running:
+        while pending and len(running) < ROUTE_PROBE_CONCURRENCY:
+            leg = pending.popleft()
+            future = plan_executor.submit(memo.call, search_flights, leg[0], leg[1], date)
+            running[future] = leg
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            leg = running.pop(future)
+            try:
+                results[leg] = future.result()
+            except Exception as e:
+                print(f"Error probing {leg[0]} -> {leg[1]}: {str(e)}")
+                results[leg] = None
+
+        viable_routes = sum(
+            1 for route in routes
+            if all(is_viable(results.get(leg)) for leg in route_legs(route))
+        )
+        if viable_routes >= MAX_ALTERNATIVE_OPTIONS:
+            # Probes already running finish in the background and still warm the offer cache
+            for future in running:
+                future.cancel()
+            print(f"Found {viable_routes} viable routes, skipped {len(pending)} queued probes "
+                  f"and stopped waiting on {len(running)} running ones")
+            break
+    return results
+
+def get_alternative_flights(session, origin, destination, date, memo=None):
     """Get alternative flight options when direct flights aren't available"""
+    # Routes often repeat legs (e.g. several options through the same hub), so share results
+    if memo is None:
+        memo = TurnMemo()
     try:
-        # Resolve origin and destination to airport codes
-        origin_code = resolve_city_to_code(origin)
-        dest_code = resolve_city_to_code(destination)
-        
-        print(f"Resolved codes - Origin: {origin_code}, Destination: {dest_code}")
-        
-        # Get route suggestions from Gemini
-        suggested_routes = get_alternative_routes(origin_code, dest_code, date)
-        print(f"Got {len(suggested_routes)} suggested routes from Gemini")
+        routes = get_alternative_routes(session, origin, destination, date)
+        results = probe_route_legs(routes, date, memo)
         
         alternative_options = []
         
-        for route in suggested_routes:
-            print(f"Processing route: {json.dumps(route, indent=2)}")
+        for route in routes:
+            legs = route_legs(route)
+            if not all(is_viable(results.get(leg)) for leg in legs):
+                continue
+            flights = results[legs[0]]
             
             if route['type'] == 'direct':
-                # Try direct flight
-                flights = get_flight_prices_with_links(route['origin'], route['destination'], date)
-                if flights:
-                    alternative_options.append({
-                        'type': 'direct',
-                        'origin': route['origin'],
-                        'destination': route['destination'],
-                        'flights': flights,
-                        'reasoning': route['reasoning']
-                    })
+                alternative_options.append({
+                    'type': 'direct',
+                    'origin': route['origin'],
+                    'destination': route['destination'],
+                    'flights': flights,
+                    'reasoning': route.get('reasoning', '')
+                })
             
             elif route['type'] == 'nearby_origin':
-                # Try flights from nearby origin airport
-                flights = get_flight_prices_with_links(route['origin'], route['destination'], date)
-                if flights:
-                    alternative_options.append({
-                        'type': 'nearby_origin',
-                        'airport': route['origin'],
-                        'flights': flights,
-                        'reasoning': route['reasoning']
-                    })
+                alternative_options.append({
+                    'type': 'nearby_origin',
+                    'airport': route['origin'],
+                    'flights': flights,
+                    'reasoning': route.get('reasoning', '')
+                })
             
             elif route['type'] == 'nearby_dest':
-                # Try flights to nearby destination airport
-                flights = get_flight_prices_with_links(route['origin'], route['destination'], date)
-                if flights:
-                    alternative_options.append({
-                        'type': 'nearby_dest',
-                        'airport': route['destination'],
-                        'flights': flights,
-                        'reasoning': route['reasoning'],
-                        'ground_transportation': route.get('ground_transportation', '')
-                    })
+                alternative_options.append({
+                    'type': 'nearby_dest',
+                    'airport': route['destination'],
+                    'flights': flights,
+                    'reasoning': route.get('reasoning', ''),
+                    'ground_transportation': route.get('ground_transportation') or get_ground_transportation(route['destination'], destination)
+                })
             
             elif route['type'] == 'hub_connection':
-                # Try hub connection
-                to_hub = get_flight_prices_with_links(route['origin'], route['hub'], date)
-                if to_hub:
-                    from_hub = get_flight_prices_with_links(route['hub'], route['destination'], date)
-                    if from_hub:
-                        alternative_options.append({
-                            'type': 'hub_connection',
-                            'hub': route['hub'],
-                            'to_hub': to_hub,
-                            'from_hub': from_hub,
-                            'reasoning': route['reasoning']
-                        })
+                alternative_options.append({
+                    'type': 'hub_connection',
+                    'hub': route['hub'],
+                    'to_hub': flights,
+                    'from_hub': results[legs[1]],
+                    'reasoning': route.get('reasoning', ''),
+                    'ground_transportation': route.get('ground_transportation', '')
+                })
+
+            if len(alternative_options) >= MAX_ALTERNATIVE_OPTIONS:
+                break
         
         print(f"Found {len(alternative_options)} alternative options")
+        if ROUTE_PROSE_LLM and alternative_options:
+            describe_routes(session, alternative_options, origin, destination)
         return alternative_options
     except Exception as e:
         print(f"Error getting alternative flights: {str(e)}")
         return []
 
-def get_ground_transportation(airport, destination):
-    """Get ground transportation options from airport to destination"""
-    # This would typically call an API or database
-    # For now, we'll use a simplified version
-    transportation = {
-        "yellowstone": {
-            "JAC": "2.5-hour drive to Yellowstone's South Entrance",
-            "BZN": "1.5-hour drive to Yellowstone's North Entrance",
-            "COD": "1-hour drive to Yellowstone's East Entrance",
-            "WYS": "Direct access to Yellowstone's West Entrance"
-        },
-        "yosemite": {
-            "FAT": "1.5-hour drive to Yosemite's South Entrance",
-            "MMH": "Direct access to Yosemite's East Entrance",
-            "RNO": "3-hour drive to Yosemite's East Entrance"
-        }
-    }
-    
-    # Convert destination to lowercase and remove common words
-    dest = destination.lower().replace("national park", "").replace("np", "").strip()
-    return transportation.get(dest, {}).get(airport, "Ground transportation available")
-
-def get_region(airport_code):
-    """Get the region for an airport code"""
-    # This is a simplified version - you might want to use a proper airport database
-    us_airports = ['SFO', 'LAX', 'JFK', 'ORD', 'ATL', 'DFW', 'DEN', 'SEA', 'LAS', 'MIA']
-    eu_airports = ['LHR', 'CDG', 'FRA', 'AMS', 'MAD', 'FCO', 'MUC', 'ZRH', 'BCN', 'LIS']
-    asia_airports = ['HKG', 'SIN', 'NRT', 'ICN', 'BKK', 'PEK', 'PVG', 'DEL', 'BOM', 'KUL']
-    middle_east = ['DXB', 'AUH', 'DOH', 'RUH', 'TLV', 'CAI', 'IST']
-    
-    if airport_code in us_airports:
-        return 'US'
-    elif airport_code in eu_airports:
-        return 'EU'
-    elif airport_code in asia_airports:
-        return 'ASIA'
-    elif airport_code in middle_east:
-        return 'MIDDLE_EAST'
-    return 'OTHER'
-
-def get_nearby_airports(airport_code):
-    """Get nearby airports for a given airport code"""
-    # This is a simplified version - you might want to use a proper airport database
-    nearby_map = {
-        'SFO': ['OAK', 'SJC'],
-        'LAX': ['BUR', 'SNA', 'ONT'],
-        'JFK': ['LGA', 'EWR'],
-        'LHR': ['LGW', 'STN', 'LTN'],
-        'CDG': ['ORY', 'BVA'],
-        'FRA': ['HHN', 'CGN'],
-        'AMS': ['RTM', 'EIN'],
-        'HKG': ['MFM', 'CAN'],
-        'SIN': ['KUL', 'BKK'],
-        'NRT': ['HND', 'CTS']
-    }
-    return nearby_map.get(airport_code, [])
-
-def format_alternative_options(alternatives):
-    """Format alternative flight options into a readable string"""
+def format_alternative_options(alternatives, follow_up=True):
+    """Format alternative flight options into a readable string, ending with next steps if `follow_up`"""
     if not alternatives:
         return "No alternative flight options found."
     
@@ -705,21 +571,21 @@ def format_alternative_options(alternatives):
         if alt['type'] == 'direct':
             response += f"✈️ Direct Flight Option:\n"
             response += f"  {alt['reasoning']}\n"
-            for flight in alt['flights']:
+            for flight in flight_lines(alt['flights']):
                 response += f"  • {flight}\n"
             response += "\n"
             
         elif alt['type'] == 'nearby_origin':
             response += f"✈️ Flights from nearby airport {alt['airport']}:\n"
             response += f"  {alt['reasoning']}\n"
-            for flight in alt['flights']:
+            for flight in flight_lines(alt['flights']):
                 response += f"  • {flight}\n"
             response += "\n"
             
         elif alt['type'] == 'nearby_dest':
             response += f"✈️ Flights to nearby airport {alt['airport']}:\n"
             response += f"  {alt['reasoning']}\n"
-            for flight in alt['flights']:
+            for flight in flight_lines(alt['flights']):
                 response += f"  • {flight}\n"
             if alt.get('ground_transportation'):
                 response += f"  🚗 Ground Transportation: {alt['ground_transportation']}\n"
@@ -729,13 +595,17 @@ def format_alternative_options(alternatives):
             response += f"✈️ Multi-city option via {alt['hub']}:\n"
             response += f"  {alt['reasoning']}\n"
             response += "  First leg:\n"
-            for flight in alt['to_hub']:
+            for flight in flight_lines(alt['to_hub']):
                 response += f"    • {flight}\n"
             response += "  Second leg:\n"
-            for flight in alt['from_hub']:
+            for flight in flight_lines(alt['from_hub']):
                 response += f"    • {flight}\n"
+            if alt.get('ground_transportation'):
+                response += f"  🚗 Ground Transportation: {alt['ground_transportation']}\n"
             response += "\n"
     
+    if not follow_up:
+        return response
     response += "Would you like to:\n"
     response += "1. Book any of these alternative flights\n"
     response += "2. Try different dates\n"
@@ -811,7 +681,7 @@ def get_restaurant_recommendations(destination):
     }
     return restaurants.get(destination, [])
 
-def generate_rag_itinerary(context):
+def generate_rag_itinerary(session, context):
     """Generate a personalized itinerary using RAG"""
     prompt = (
         "Create a detailed travel itinerary based on the following context:\n\n"
@@ -819,11 +689,11 @@ def generate_rag_itinerary(context):
         f"Duration: {context['duration']} days\n"
         f"Interests: {context['interests']}\n\n"
         "Flight Information:\n"
-        f"{json.dumps(context['flights'], indent=2)}\n\n"
+        f"{json.dumps(as_plain(context['flights']), indent=2)}\n\n"
         "Hotel Options:\n"
-        f"{json.dumps(context['hotels'], indent=2)}\n\n"
+        f"{json.dumps(as_plain(context['hotels']), indent=2)}\n\n"
         "Weather Forecast:\n"
-        f"{json.dumps(context['weather'], indent=2)}\n\n"
+        f"{json.dumps(as_plain(context['weather']), indent=2)}\n\n"
         "Available Activities:\n"
         f"{json.dumps(context['available_activities'], indent=2)}\n\n"
         "Local Events:\n"
@@ -843,24 +713,25 @@ def generate_rag_itinerary(context):
     )
     
     try:
-        response = chat.send_message(prompt)
+        response = send_in_conversation(session, prompt)
         return response.text
     except Exception as e:
         print(f"Error generating RAG itinerary: {str(e)}")
         return "I apologize, but I'm having trouble generating a personalized itinerary at the moment."
 
-def format_rag_response(itinerary, flights, hotels, weather):
+def format_rag_response(session, itinerary, flights, hotels, weather):
     """Format the complete RAG-based response"""
+    trip_context = session.trip_context
     response = "Here's your personalized travel plan based on your preferences and real-time data:\n\n"
     
     # Add weather information
     response += "🌤️ Weather Forecast:\n"
-    response += weather + "\n\n"
+    response += "".join(forecast_text(forecast) for forecast in weather or []) + "\n\n"
     
     # Add flight options
-    if flights:
+    if flights and flights.offers:
         response += "✈️ Flight Options:\n"
-        for flight in flights:
+        for flight in flight_lines(flights):
             response += f"• {flight}\n"
         response += "\n"
     else:
@@ -870,6 +741,7 @@ def format_rag_response(itinerary, flights, hotels, weather):
         # Get alternative flight options
         response += "🔍 Checking alternative routes...\n\n"
         alternative_options = get_alternative_flights(
+            session,
             trip_context["origin"],
             trip_context["destination"],
             trip_context["departure_date"]
@@ -885,9 +757,9 @@ def format_rag_response(itinerary, flights, hotels, weather):
             response += "3. Consider a different destination\n\n"
     
     # Add hotel options
-    if hotels:
+    if hotels and hotels.offers:
         response += "🏨 Hotel Options:\n"
-        for hotel in hotels:
+        for hotel in hotel_lines(hotels):
             response += f"• {hotel}\n"
         response += "\n"
     else:
@@ -905,14 +777,166 @@ def format_rag_response(itinerary, flights, hotels, weather):
     
     return response
 
-def chat_with_gemini(user_input):
+def detached_session(session, on_event):
+    """
+    A copy of `session` for plan work that can outlive the turn: a source that times out keeps
+    running, so it talks to its own chat seeded with the session's history instead of the
+    session's chat, which the user's next turn may already be using. It streams only to
+    `on_event`, the listener of the turn that started it.
+    """
+    detached = ChatSession(session.session_id, gemini_model().start_chat(history=list(session.chat.history)))
+    detached.trip_context = dict(session.trip_context)
+    detached.turn_metrics = session.turn_metrics
+    detached.on_event = on_event
+    return detached
+
+def fetch_plan_sections(session, memo):
+    """
+    Fetch the independent parts of a travel plan concurrently.
+    Each source has its own timeout; one that fails or times out comes back as None
+    so the plan can still be assembled from the sections that finished.
+    Calls go through the turn's memo, so a source is fetched at most once per turn.
+    """
+    trip_context = session.trip_context
+    destination = trip_context["destination"]
+    # Taken once for this turn; jobs never read the listener from the shared session
+    on_event = session.on_event
+    itinerary_session = detached_session(session, on_event)
+    jobs = {
+        "flights": (search_flights, trip_context["origin"], destination, trip_context["departure_date"]),
+        "hotels": (search_hotels, destination, trip_context["departure_date"], trip_context["return_date"]),
+        # One range request covers the whole trip
+        "weather": (get_weather_range, destination, trip_context["departure_date"], trip_context["return_date"]),
+        "itinerary": (generate_itinerary_html, itinerary_session, destination, trip_context["duration"], trip_context["interests"])
+    }
+    started = time.monotonic()
+    futures = {plan_executor.submit(memo.call, *job): name for name, job in jobs.items()}
+    # Timeouts count from when the fan-out started, not from when we got to a source
+    deadlines = {name: started + PLAN_SOURCE_TIMEOUTS[name] for name in jobs}
+
+    sections = {}
+    pending = dict(futures)
+    while pending:
+        next_deadline = min(deadlines[name] for name in pending.values())
+        done, _ = wait(pending, timeout=max(next_deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            try:
+                sections[name] = future.result()
+            except Exception as e:
+                print(f"Plan source '{name}' failed: {str(e)}")
+                sections[name] = None
+            # Streaming callers can show this section before the slower ones finish
+            emit_to(on_event, "section", name=name, text=render_plan_section(name, sections[name]))
+        now = time.monotonic()
+        for future, name in list(pending.items()):
+            if now >= deadlines[name]:
+                future.cancel()
+                if name == "itinerary":
+                    # The job may still be generating; its tokens must not reach any listener now
+                    itinerary_session.on_event = None
+                print(f"Plan source '{name}' timed out after {PLAN_SOURCE_TIMEOUTS[name]}s")
+                sections[name] = None
+                del pending[future]
+                emit_to(on_event, "section", name=name, text=render_plan_section(name, None))
+    if sections["itinerary"] is not None:
+        # Finished within the turn, which still holds the session lock: keep the exchange
+        session.chat.history = itinerary_session.chat.history
+    print(f"Plan sections fetched in {time.monotonic() - started:.2f}s")
+    return sections
+
+def render_itinerary_section(itinerary):
+    if itinerary:
+        return "Here's the itinerary for your trip:\n\n" + itinerary + "\n\n"
+    return "Here's the itinerary for your trip:\n\n❌ Unable to generate the itinerary at the moment.\n\n"
+
+def render_weather_section(weather):
+    text = "🌤️ Weather Forecast:\n\n"
+    if weather:
+        # Departure and return days, as before; the other days are cached for later
+        for forecast in ([weather[0], weather[-1]] if len(weather) > 1 else weather):
+            text += forecast_text(forecast) + "\n"
+    else:
+        text += "❌ Weather data is unavailable at the moment.\n"
+    return text + "\n"
+
+def render_flights_section(flights):
+    if flights and (flights.offers or flights.error):
+        return "✈️ Flight Options:\n\n" + "".join(flight + "\n" for flight in flight_lines(flights)) + "\n"
+    if flights is None:
+        return "❌ Flight search is taking too long, please try again shortly.\n\n"
+    return "❌ No direct flights found for your dates.\n\n"
+
+def render_hotels_section(hotels):
+    if hotels and hotels.offers:
+        return "🏨 Hotel Options:\n\n" + "".join(hotel + "\n" for hotel in hotel_lines(hotels)) + "\n"
+    return "❌ No hotels found for your dates.\n\n"
+
+# Plan sections in the order they appear in the reply
+PLAN_SECTION_RENDERERS = {
+    "itinerary": render_itinerary_section,
+    "weather": render_weather_section,
+    "flights": render_flights_section,
+    "hotels": render_hotels_section
+}
+
+def render_plan_section(name, value):
+    return PLAN_SECTION_RENDERERS[name](value)
+
+def render_alternative_flights_section(alternatives):
+    """The flights section when there is no direct flight but alternative routes were found"""
+    return (
+        "✈️ Flight Options:\n\n❌ No direct flights found for your dates.\n\n"
+        + format_alternative_options(alternatives, follow_up=False)
+    )
+
+def format_plan_response(sections, rendered=None):
+    """
+    Render the sections returned by fetch_plan_sections into the chat reply.
+    `rendered` holds section texts that replace the default rendering, by section name.
+    """
+    rendered = rendered or {}
+    return "".join(
+        rendered[name] if name in rendered else render_plan_section(name, sections[name])
+        for name in PLAN_SECTION_RENDERERS
+    )
+
+def chat_with_gemini(user_input, session_id=DEFAULT_SESSION_ID):
+    """Run one conversation turn for the user identified by `session_id`"""
+    session = sessions.get(session_id)
+    with session.lock:
+        start_turn_metrics(session)
+        reply = run_chat_turn(session, user_input)
+        print(f"Turn prompt metrics: {turn_metrics_summary(session)}")
+        return reply
+
+def stream_chat_with_gemini(user_input, session_id, on_event):
+    """
+    Like chat_with_gemini, but partial output is passed to `on_event` as it becomes ready:
+    {"type": "section", "name", "text"} for each finished plan section and
+    {"type": "token", "text"} for itinerary text as Gemini generates it.
+    Returns the complete reply, which callers store and show once the turn is over.
+    """
+    session = sessions.get(session_id)
+    with session.lock:
+        start_turn_metrics(session)
+        session.on_event = on_event
+        try:
+            reply = run_chat_turn(session, user_input)
+        finally:
+            session.on_event = None
+        print(f"Turn prompt metrics: {turn_metrics_summary(session)}")
+        return reply
+
+def run_chat_turn(session, user_input):
+    trip_context = session.trip_context
     try:
         # Parse user intent using Gemini
-        parsed_intent = parse_user_intent(user_input)
+        parsed_intent = parse_user_intent(session, user_input)
         
         # Handle reset intent
         if parsed_intent["is_reset"]:
-            return reset_trip_context()
+            return reset_trip_context(session)
         
         # Handle greeting intent
         if parsed_intent["is_greeting"]:
@@ -962,110 +986,36 @@ def chat_with_gemini(user_input):
                     trip_context["duration"]
                 )
             
-            # Get flight options
-            flights = get_flight_prices_with_links(
-                trip_context["origin"],
-                trip_context["destination"],
-                trip_context["departure_date"]
-            )
+            # Fetch flights, hotels, weather and the itinerary concurrently, once each
+            memo = TurnMemo()
+            sections = fetch_plan_sections(session, memo)
+            flights = sections["flights"]
             
-            # If no direct flights found, get alternative routes
-            if not flights:
+            # If the search worked but found nothing, offer alternative routes alongside the rest of the plan
+            rendered = {}
+            if flights is not None and not flights.offers and not flights.error:
                 print("No direct flights found, checking alternative routes...")
                 alternative_options = get_alternative_flights(
+                    session,
                     trip_context["origin"],
                     trip_context["destination"],
-                    trip_context["departure_date"]
+                    trip_context["departure_date"],
+                    memo
                 )
                 
                 if alternative_options:
                     print(f"Found {len(alternative_options)} alternative routes")
-                    response = format_alternative_options(alternative_options)
-                    return response
+                    rendered["flights"] = render_alternative_flights_section(alternative_options)
+                    # Replaces the "no direct flights" section streaming callers were already shown
+                    emit(session, "section", name="flights", text=rendered["flights"])
                 else:
                     print("No alternative routes found")
             
-            # Get hotel options
-            hotels = get_hotel_prices_with_links(
-                trip_context["destination"],
-                trip_context["departure_date"],
-                trip_context["return_date"]
-            )
-            
-            # Get weather information
-            try:
-                departure_weather = get_weather_climatology(
-                    trip_context["destination"],
-                    trip_context["departure_date"]
-                )
-                return_weather = get_weather_climatology(
-                    trip_context["destination"],
-                    trip_context["return_date"]
-                )
-                weather_info = f"Departure: {departure_weather}\nReturn: {return_weather}"
-                
-
-                # Get weather information
-                try:
-                    departure_weather = get_weather_climatology(
-                        trip_context["destination"],
-                        trip_context["departure_date"]
-                    )
-                    return_weather = get_weather_climatology(
-                        trip_context["destination"],
-                        trip_context["return_date"]
-                    )
-                    
-                    response_text = "Here's your complete travel plan:\n\n"
-                    itinerary = generate_itinerary_html(
-                            trip_context["destination"],
-                            trip_context["duration"],
-                            trip_context["interests"]
-                        )
-                    response_text = "Here's the itinerary for your trip:\n\n"
-                    response_text += itinerary + "\n\n"
-                    # Add weather information
-                    response_text += "🌤️ Weather Forecast:\n\n"
-                    response_text += departure_weather + "\n"
-                    response_text += return_weather + "\n\n"
-                    
-                    # Add flight options
-                    if flights:
-                        response_text += "✈️ Flight Options:\n\n"
-                        for flight in flights:
-                            response_text += flight + "\n"
-                        response_text += "\n"
-                    else:
-                        response_text += "❌ No direct flights found for your dates.\n\n"
-                    
-                    # Add hotel options
-                    if hotels:
-                        response_text += "🏨 Hotel Options:\n\n"
-                        for hotel in hotels:
-                            response_text += hotel + "\n"
-                        response_text += "\n"
-                    else:
-                        response_text += "❌ No hotels found for your dates.\n\n"
-                    
-                    # Stage 4: Ask about interests for revised itinerary
-                    if not trip_context.get("interests"):
-                        response_text += "Please let me know your interests and preferences and I can customize the itinerary accordingly."
-                    else:
-                        # Stage 5: Generate revised itinerary with interests
-                        revised_itinerary = generate_itinerary_html(
-                            trip_context["destination"],
-                            trip_context["duration"],
-                            trip_context["interests"]
-                        )
-                        response_text += "Here's your revised itinerary based on your interests:\n\n"
-                        response_text += revised_itinerary
-                    
-                    return response_text
-                    
-                except Exception as e:
-                    print(f"Error fetching data: {str(e)}")
-                    response_text += "❌ Unable to fetch some data at the moment.\n"
-                    return response_text
+            # The itinerary above was already generated with the user's interests,
+            # so there is no separate revised itinerary to add
+            response_text = format_plan_response(sections, rendered)
+            print(f"Plan turn: {memo.summary()}")
+            return response_text
         
         # If we don't have destination or duration, ask for them
         if not trip_context["destination"]:
@@ -1084,6 +1034,7 @@ def chat_with_gemini(user_input):
 def main():
     print("\U0001F972 Travel Itinerary Chatbot with Memory\nType 'exit' to end the conversation.\n")
     initialize_chat()
+    session = sessions.get(DEFAULT_SESSION_ID)
 
     while True:
         user_input = input("\U0001F9D1 You: ")
@@ -1092,8 +1043,8 @@ def main():
             break
 
         # Check if we have a complete plan
-        if all(trip_context.values()):
-            reply = handle_follow_up(user_input)
+        if all(session.trip_context.values()):
+            reply = handle_follow_up(session, user_input)
         else:
             reply = chat_with_gemini(user_input)
             
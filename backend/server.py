@@ -5,14 +5,27 @@ import uvicorn
 import sys
 import os
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, DateTime
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, and_, or_
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
-from sample import chat_with_gemini, initialize_chat
+from sample import chat_with_gemini, stream_chat_with_gemini, warm_up_chat
 from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from db import create_db_engine, WriteBehindQueue
+from auth_cache import AuthUser, cached_user, cache_user, invalidate_user, auth_cache_stats
+from amadeus_api import code_resolution_stats
+from hotel_api import hotel_cache_stats
+from weather_api import weather_cache_stats
+from llm_cache import llm_cache_stats
+from intent_classifier import classifier_stats
+from http_client import upstream
 import io
 import json
 from typing import List, Optional
@@ -40,16 +53,139 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize chat
-initialize_chat()
+# --- Chat worker pool ---
+# chat_with_gemini blocks on Gemini, Amadeus and Hotellook calls, so it runs on a
+# bounded thread pool instead of the event loop
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", 32))
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", 120))
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat")
+
+
+async def run_chat(message: str, session_id: str):
+    """Run a chat turn on the worker pool; raises asyncio.TimeoutError after CHAT_TIMEOUT_SECONDS"""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(chat_executor, chat_with_gemini, message, session_id)
+    # On timeout wait_for cancels the future, which drops the turn if it is still queued
+    return await asyncio.wait_for(future, timeout=CHAT_TIMEOUT_SECONDS)
+
+
+# --- Password hashing pool ---
+# Each bcrypt hash or verify burns 100-300 ms of CPU. They run on their own small pool so a
+# burst of logins cannot take the threads and cores that chat requests need.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Requests each auth endpoint handles at once, and how long a request waits for a slot before
+# it is answered 503. These slots are what shed load: each request runs at most one bcrypt
+# call, so the pool never has more than their sum (20 by default) jobs running or queued.
+AUTH_ENDPOINT_CONCURRENCY = {
+    "signup": int(os.getenv("SIGNUP_CONCURRENCY", 4)),
+    "login": int(os.getenv("LOGIN_CONCURRENCY", 16))
+}
+AUTH_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AUTH_QUEUE_TIMEOUT_SECONDS", 5))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+auth_endpoint_slots = {name: asyncio.Semaphore(limit) for name, limit in AUTH_ENDPOINT_CONCURRENCY.items()}
+
+
+def too_busy():
+    return HTTPException(status_code=503, detail="Too many sign-ins right now, please try again shortly",
+                         headers={"Retry-After": "1"})
+
+
+async def run_password_job(fn, *args):
+    """Run a bcrypt call on the password pool; callers hold an endpoint_slot, which bounds its queue"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, fn, *args)
+
+
+@asynccontextmanager
+async def endpoint_slot(name: str):
+    """Hold one of the endpoint's concurrency slots, waiting up to AUTH_QUEUE_TIMEOUT_SECONDS for it"""
+    slots = auth_endpoint_slots[name]
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=AUTH_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise too_busy()
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def sse_event(event_type: str, data: dict):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_chat(message: str, session_id: str, on_reply):
+    """
+    Run a chat turn on the worker pool and yield Server-Sent Events as it progresses:
+    "section" and "token" events while the plan is assembled, then "done" with the full reply.
+    `on_reply` is called with the reply before "done" is sent, e.g. to save it.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    # The turn runs on a worker thread; hand its events over to the event loop
+    on_event = lambda event: loop.call_soon_threadsafe(events.put_nowait, event)
+    future = loop.run_in_executor(chat_executor, stream_chat_with_gemini, message, session_id, on_event)
+    deadline = loop.time() + CHAT_TIMEOUT_SECONDS
+    try:
+        while not future.done():
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({getter, future}, timeout=max(deadline - loop.time(), 0),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                getter.cancel()
+                raise asyncio.TimeoutError()
+            if getter in done:
+                event = getter.result()
+                yield sse_event(event.pop("type"), event)
+            else:
+                getter.cancel()
+        while not events.empty():
+            event = events.get_nowait()
+            yield sse_event(event.pop("type"), event)
+        response = future.result()
+        on_reply(response)
+        yield sse_event("done", {"response": response})
+    except asyncio.TimeoutError:
+        future.cancel()
+        logger.error(f"Streamed chat request timed out after {CHAT_TIMEOUT_SECONDS}s")
+        yield sse_event("error", {"detail": "The travel assistant took too long to respond"})
+    except Exception as e:
+        logger.error(f"Error streaming response: {str(e)}", exc_info=True)
+        yield sse_event("error", {"detail": str(e)})
+
+
+@app.on_event("startup")
+async def warm_up_clients():
+    """
+    Build the Gemini and Amadeus clients in the background once the server is up,
+    so importing the app never waits on them and the first chat does not pay for it
+    """
+    loop = asyncio.get_running_loop()
+
+    def warm_up():
+        try:
+            logger.info(f"Clients warmed up in {warm_up_chat()} s")
+        except Exception as e:
+            # Clients are built on first use anyway; a failed warm-up only costs that request
+            logger.error(f"Client warm-up failed: {str(e)}")
+
+    loop.run_in_executor(chat_executor, warm_up)
+
+
+@app.on_event("shutdown")
+def shutdown_chat_executor():
+    chat_executor.shutdown(wait=False, cancel_futures=True)
+    password_executor.shutdown(wait=False, cancel_futures=True)
+    # Write out chat messages still waiting in the queue
+    message_writer.flush(timeout=5)
 
 # --- Database setup ---
-SQLALCHEMY_DATABASE_URL = "sqlite:///./users.db"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Pool size, SQLite WAL mode and the database itself (DATABASE_URL) are configured in db.py
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+# Chat messages are saved in batches off the request path
+message_writer = WriteBehindQueue(SessionLocal)
 
 
 class User(Base):
@@ -70,7 +206,19 @@ class ChatMessage(Base):
     
     user = relationship("User", back_populates="messages")
 
+    # Serves the keyset pagination in /api/chat-history
+    __table_args__ = (Index("ix_chat_messages_user_timestamp_id", "user_id", "timestamp", "id"),)
+
 Base.metadata.create_all(bind=engine)
+# create_all skips tables that already exist, so add the index to older databases too
+for index in ChatMessage.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+# Messages per /api/chat-history page, by default and at most
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+# Rows fetched per query while streaming a full export
+EXPORT_BATCH_SIZE = 500
 
 # --- Auth utils ---
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -103,16 +251,36 @@ def get_db():
     finally:
         db.close()
 def get_current_user(token: str = Depends(lambda x: x), db: Session = Depends(get_db)):
+    """
+    The AuthUser for a token, or None if it is invalid or expired. Verified tokens are cached,
+    and tokens carrying the uid claim never need the database.
+    """
+    user = cached_user(token)
+    if user:
+        return user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if email is None:
             return None
-        user = db.query(User).filter(User.email == email).first()
+        if "uid" in payload:
+            user = AuthUser(payload["uid"], email, payload.get("name", ""))
+        else:
+            # Tokens issued before the uid claim existed
+            record = db.query(User).filter(User.email == email).first()
+            if record is None:
+                return None
+            user = AuthUser(record.id, record.email, record.name)
+        cache_user(token, user, payload["exp"])
         return user
     except:
         return None
 
+
+def user_token(user: User):
+    # The id travels in the signed claims so authenticated requests skip the user lookup
+    return create_access_token({"sub": user.email, "uid": user.id, "name": user.name})
+
 # --- Pydantic models ---
 class SignupRequest(BaseModel):
     name: str
@@ -128,6 +296,7 @@ class LoginRequest(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     token: Optional[str] = None
+    session_id: Optional[str] = None  # Keeps anonymous conversations apart
 
 
 class MessageResponse(BaseModel):
@@ -137,29 +306,40 @@ class MessageResponse(BaseModel):
     timestamp: datetime
 
 # --- Auth endpoints ---
-@app.post("/api/signup")
-def signup(request: SignupRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
-    if user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(request.password)
-    new_user = User(
-        name=request.name, email=request.email, hashed_password=hashed_password
-    )
+def find_user(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+
+def create_user(db: Session, name: str, email: str, hashed_password: str):
+    new_user = User(name=name, email=email, hashed_password=hashed_password)
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
-    token = create_access_token({"sub": new_user.email})
+    return new_user
+
+
+@app.post("/api/signup")
+async def signup(request: SignupRequest, db: Session = Depends(get_db)):
+    async with endpoint_slot("signup"):
+        user = await run_in_threadpool(find_user, db, request.email)
+        if user:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        hashed_password = await run_password_job(get_password_hash, request.password)
+        new_user = await run_in_threadpool(create_user, db, request.name, request.email, hashed_password)
+    # Drop anything cached for this email before the account existed
+    invalidate_user(new_user.email)
+    token = user_token(new_user)
     logger.info(f"New user registered: {new_user.name}, {new_user.email}")
     return {"token": token, "name": new_user.name}
 
 
 @app.post("/api/login")
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
-    if not user or not verify_password(request.password, user.hashed_password):
-        raise HTTPException(status_code=401, detail="Invalid email or password")
-    token = create_access_token({"sub": user.email})
+async def login(request: LoginRequest, db: Session = Depends(get_db)):
+    async with endpoint_slot("login"):
+        user = await run_in_threadpool(find_user, db, request.email)
+        if not user or not await run_password_job(verify_password, request.password, user.hashed_password):
+            raise HTTPException(status_code=401, detail="Invalid email or password")
+    token = user_token(user)
     logger.info(f"User logged in: {user.name}, {user.email}")
     return {"token": token, "name": user.name}
 
@@ -169,33 +349,15 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
 async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     try:
         logger.info(f"Received message: {request.message}")
-        user = None
-        
-        # Try to authenticate the user if token is provided
-        if request.token:
-            user = get_current_user(request.token, db)
-            
-        response = chat_with_gemini(request.message)
+        received_at = datetime.utcnow()
+        user, session_id, anonymous_id = await run_in_threadpool(resolve_chat_user, request, db)
+
+        response = await run_chat(request.message, session_id)
         logger.info(f"Generated response: {response}")
         
         # Save the conversation if user is authenticated
         if user and not isinstance(response, dict):
-            # Save user message
-            user_message = ChatMessage(
-                user_id=user.id,
-                sender="user",
-                content=request.message
-            )
-            db.add(user_message)
-            
-            # Save bot response
-            bot_message = ChatMessage(
-                user_id=user.id,
-                sender="bot",
-                content=response
-            )
-            db.add(bot_message)
-            db.commit()
+            save_exchange(user.id, request.message, response, received_at)
 
         # If the response is a PDF, stream it as a file
         # if isinstance(response, dict) and response.get("type") == "pdf":
@@ -207,27 +369,187 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
         #         headers={"Content-Disposition": f"attachment; filename={filename}"}
         #     )
         # Otherwise, return as JSON
-        return JSONResponse({"response": response})
+        # Anonymous callers send session_id back on their next turn to keep their conversation
+        return JSONResponse({"response": response, "session_id": anonymous_id})
+    except asyncio.TimeoutError:
+        logger.error(f"Chat request timed out after {CHAT_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="The travel assistant took too long to respond")
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def resolve_chat_user(request: ChatRequest, db: Session):
+    """
+    The authenticated user, if any, the chat session id their turn runs in, and for
+    anonymous callers the id to hand back so their next turn finds the same conversation
+    """
+    user = get_current_user(request.token, db) if request.token else None
+    # Each user (or anonymous session) gets its own conversation and trip context
+    if user:
+        return user, f"user:{user.id}", None
+    # Callers without an id get a fresh one; they never share a conversation
+    anonymous_id = request.session_id or uuid.uuid4().hex
+    return None, f"anon:{anonymous_id}", anonymous_id
+
+
+def save_exchange(user_id: int, message: str, response: str, received_at: datetime):
+    """Queue both sides of a chat turn for the background writer; the reply is not held up by the commit"""
+    queued = message_writer.put(
+        ChatMessage(user_id=user_id, sender="user", content=message, timestamp=received_at),
+        ChatMessage(user_id=user_id, sender="bot", content=response, timestamp=datetime.utcnow())
+    )
+    if not queued:
+        # The writer is far behind; the user still gets the reply, only its history entry is lost
+        logger.warning(f"Message queue full, chat turn of user {user_id} not saved "
+                       f"({message_writer.stats['rejected']} messages rejected so far)")
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, db: Session = Depends(get_db)):
+    """/api/chat as Server-Sent Events: plan sections and itinerary text arrive as soon as they are ready"""
+    logger.info(f"Received streamed message: {request.message}")
+    received_at = datetime.utcnow()
+    user, session_id, anonymous_id = await run_in_threadpool(resolve_chat_user, request, db)
+    user_id = user.id if user else None
+
+    def on_reply(response):
+        logger.info(f"Generated response: {response}")
+        if user_id is not None:
+            save_exchange(user_id, request.message, response, received_at)
+
+    async def events():
+        if anonymous_id:
+            # Sent first so the caller can keep its conversation even if the turn fails
+            yield sse_event("session", {"session_id": anonymous_id})
+        async for event in stream_chat(request.message, session_id, on_reply):
+            yield event
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come instead of buffering the response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def message_json(message: ChatMessage):
+    return {
+        "id": message.id,
+        "sender": message.sender,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat()
+    }
+
+
+def history_cursor(message: ChatMessage):
+    """Opaque position of a message: its timestamp and id, the order history is read in"""
+    return f"{message.timestamp.isoformat()}_{message.id}"
+
+
+def parse_history_cursor(cursor: str):
+    try:
+        timestamp, message_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+
+
+def messages_page(db: Session, user_id: int, limit: int, before=None, newest_first=True):
+    """
+    Up to `limit` of a user's messages on one side of the `before` (timestamp, id) position,
+    walked along the (user_id, timestamp, id) index instead of sorting the whole history
+    """
+    query = db.query(ChatMessage).filter(ChatMessage.user_id == user_id)
+    if before is not None:
+        timestamp, message_id = before
+        if newest_first:
+            query = query.filter(or_(
+                ChatMessage.timestamp < timestamp,
+                and_(ChatMessage.timestamp == timestamp, ChatMessage.id < message_id)
+            ))
+        else:
+            query = query.filter(or_(
+                ChatMessage.timestamp > timestamp,
+                and_(ChatMessage.timestamp == timestamp, ChatMessage.id > message_id)
+            ))
+    if newest_first:
+        query = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+    else:
+        query = query.order_by(ChatMessage.timestamp, ChatMessage.id)
+    return query.limit(limit).all()
+
+
 @app.get("/api/chat-history")
-async def get_chat_history(token: str, db: Session = Depends(get_db)):
-    user = get_current_user(token, db)
+async def get_chat_history(token: str, limit: int = HISTORY_PAGE_SIZE, before: Optional[str] = None,
+                           db: Session = Depends(get_db)):
+    """
+    The user's most recent `limit` messages before the `before` cursor, oldest first.
+    `next_before` is the cursor for the page of older messages, or null on the first message.
+    """
+    user = await run_in_threadpool(get_current_user, token, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    messages = db.query(ChatMessage).filter(ChatMessage.user_id == user.id).order_by(ChatMessage.timestamp).all()
-    
-    return {"messages": [
-        {
-            "id": message.id,
-            "sender": message.sender,
-            "content": message.content,
-            "timestamp": message.timestamp
-        } for message in messages
-    ]}
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    position = parse_history_cursor(before) if before else None
+
+    def load_page():
+        # Include the user's latest turn even if it is still waiting in the write queue
+        if position is None:
+            message_writer.flush(timeout=2)
+        # One extra row tells whether there is an older page
+        return messages_page(db, user.id, limit + 1, position)
+
+    messages = await run_in_threadpool(load_page)
+    page = messages[:limit]
+    return {
+        "messages": [message_json(message) for message in reversed(page)],
+        "next_before": history_cursor(page[-1]) if len(messages) > limit else None
+    }
+
+
+@app.get("/api/chat-history/export")
+async def export_chat_history(token: str, db: Session = Depends(get_db)):
+    """The user's whole history, oldest first, serialized as it is read so memory stays flat"""
+    user = await run_in_threadpool(get_current_user, token, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_id = user.id
+    await run_in_threadpool(message_writer.flush, 2)
+
+    def generate():
+        # Runs on the threadpool while the response streams, with its own session
+        export_db = SessionLocal()
+        try:
+            yield '{"messages": ['
+            position, first = None, True
+            while True:
+                batch = messages_page(export_db, user_id, EXPORT_BATCH_SIZE, position, newest_first=False)
+                for message in batch:
+                    yield ("" if first else ",") + json.dumps(message_json(message))
+                    first = False
+                if len(batch) < EXPORT_BATCH_SIZE:
+                    break
+                position = (batch[-1].timestamp, batch[-1].id)
+                export_db.expunge_all()
+            yield "]}"
+        finally:
+            export_db.close()
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Cache hit rates, upstream circuit states and write-queue counters of this worker"""
+    return {
+        "intent_classifier": classifier_stats(),
+        "airport_codes": code_resolution_stats(),
+        "hotel_cache": hotel_cache_stats(),
+        "weather_cache": weather_cache_stats(),
+        "llm_cache": llm_cache_stats(),
+        "auth_cache": auth_cache_stats(),
+        "upstream": {**upstream.stats, "circuits": upstream.circuit_states()},
+        "message_writer": dict(message_writer.stats)
+    }
 
 
 # @app.post("/api/download_pdf")
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Idle sessions are dropped after this many seconds
+SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL", 30 * 60))
+# Upper bound on live sessions held in memory
+MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX", 5000))
+
+
+def new_trip_context():
+    """Return an empty trip context for a fresh conversation"""
+    return {
+        "origin": "",
+        "destination": "",
+        "departure_date": "",
+        "return_date": "",
+        "interests": "",
+        "duration": ""
+    }
+
+
+class ChatSession:
+    """Conversation state for one user: the Gemini chat handle and the trip context"""
+
+    def __init__(self, session_id, chat):
+        self.session_id = session_id
+        self.chat = chat
+        self.trip_context = new_trip_context()
+        # Serializes turns of the same conversation; the Gemini chat history is not thread-safe
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # Prompt sizes sent to Gemini during the current turn, see chat_history
+        self.turn_metrics = Counter()
+        # Receives partial output (plan sections, itinerary tokens) while a streamed turn runs
+        self.on_event = None
+
+
+class SessionManager:
+    """
+    Holds one ChatSession per user or session token.
+    Sessions are kept in least-recently-used order; idle sessions expire after
+    `ttl_seconds` and the oldest ones are evicted once `max_sessions` is reached.
+    """
+
+    def __init__(self, chat_factory, max_sessions=MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS):
+        self.chat_factory = chat_factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return the session for `session_id`, creating it if needed"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+                return session
+
+        # Build the chat outside the lock so a slow factory does not block other users
+        session = ChatSession(session_id, self.chat_factory())
+        with self._lock:
+            existing = self._sessions.get(session_id)
+            if existing is not None:
+                existing.last_used = now
+                self._sessions.move_to_end(session_id)
+                return existing
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                print(f"Evicted chat session {evicted_id} (session cap reached)")
+        return session
+
+    def drop(self, session_id):
+        """Forget a session, e.g. on logout"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict_expired(self, now):
+        # Sessions are ordered by last use, so expired ones are always at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            print(f"Evicted idle chat session {session_id}")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
@@ -0,0 +1,60 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.asin(math.sqrt(a))
+
+
+class GridIndex:
+    """
+    Points bucketed into fixed-size latitude/longitude cells, like a fixed-precision geohash.
+    A radius query only measures the points in the cells overlapping the search circle.
+    """
+
+    def __init__(self, points, cell_degrees=1.0):
+        """`points` is an iterable of (key, latitude, longitude)"""
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.size = 0
+        for key, latitude, longitude in points:
+            self.cells.setdefault(self._cell(latitude, longitude), []).append((key, latitude, longitude))
+            self.size += 1
+
+    def _cell(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def within(self, latitude, longitude, radius_km):
+        """[(key, km)] for points within `radius_km`, nearest first"""
+        lat_span = radius_km / KM_PER_DEGREE
+        # Longitude degrees shrink towards the poles; near them just scan every longitude
+        cos_lat = math.cos(math.radians(min(abs(latitude) + lat_span, 89.0)))
+        lon_span = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+
+        lat_cells = range(math.floor((latitude - lat_span) / self.cell_degrees),
+                          math.floor((latitude + lat_span) / self.cell_degrees) + 1)
+        lon_first = math.floor((longitude - lon_span) / self.cell_degrees)
+        lon_last = math.floor((longitude + lon_span) / self.cell_degrees)
+        cells_around = round(360 / self.cell_degrees)
+        lon_cells = {
+            # Wrap across the antimeridian into the cell numbering used at build time
+            (cell + cells_around // 2) % cells_around - cells_around // 2
+            for cell in range(lon_first, lon_last + 1)
+        }
+
+        found = []
+        for lat_cell in lat_cells:
+            for lon_cell in lon_cells:
+                for key, point_lat, point_lon in self.cells.get((lat_cell, lon_cell), ()):
+                    km = haversine_km(latitude, longitude, point_lat, point_lon)
+                    if km <= radius_km:
+                        found.append((key, km))
+        return sorted(found, key=lambda item: item[1])
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from types import SimpleNamespace
+
+# Before the backend modules open their on-disk caches
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+import pytest
+import sample
+
+GEMINI_ROUTES = """```json
+{"routes": [
+  {"type": "hub_connection", "origin": "ZZZ", "hub": "CDG", "destination": "JFK", "reasoning": "Via Paris"},
+  {"type": "nearby_origin", "origin": "YYY", "destination": "JFK", "reasoning": "Closer airport"},
+  {"type": "hub_connection", "origin": "ZZZ", "destination": "JFK", "reasoning": "No hub given"},
+  {"type": "teleport", "origin": "ZZZ", "destination": "JFK"},
+  {"type": "direct", "origin": "Zed City", "destination": "JFK"}
+]}
+```"""
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Stub code resolution and record the routing prompts sent to Gemini"""
+    prompts = []
+
+    def ask_stateless(session, prompt):
+        prompts.append(prompt)
+        return SimpleNamespace(text=GEMINI_ROUTES)
+
+    monkeypatch.setattr(sample, "ask_stateless", ask_stateless)
+    monkeypatch.setattr(sample, "resolve_city_to_code", lambda place: place)
+    return prompts
+
+
+def test_bundled_places_are_planned_locally(gemini):
+    routes = sample.get_alternative_routes(None, "BOS", "JAC", "2030-06-01")
+
+    assert routes
+    assert gemini == []
+
+
+def test_unknown_place_falls_back_to_gemini(gemini):
+    routes = sample.get_alternative_routes(None, "ZZZ", "JFK", "2030-06-01")
+
+    assert len(gemini) == 1
+    # Only well-formed suggestions with IATA codes for every leg are probed
+    assert [(route["type"], *sample.route_legs(route)) for route in routes] == [
+        ("hub_connection", ("ZZZ", "CDG"), ("CDG", "JFK")),
+        ("nearby_origin", ("YYY", "JFK"))
+    ]
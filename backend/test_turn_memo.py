@@ -0,0 +1,121 @@
+import os
+import tempfile
+from collections import Counter
+from types import SimpleNamespace
+
+# Before the backend modules open their on-disk caches
+os.environ["CACHE_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "test_cache.db")
+
+import pytest
+import sample
+from records import FlightOffer, FlightSearch, HotelSearch
+
+ORIGIN, DESTINATION, HUB = "BOS", "JAC", "DEN"
+PLAN_CONTEXT = {
+    "origin": ORIGIN,
+    "destination": DESTINATION,
+    "departure_date": "2030-06-01",
+    "return_date": "2030-06-05",
+    "duration": "4",
+    "interests": "hiking",
+    "budget": "",
+    "accommodation": ""
+}
+
+
+def offer(origin, destination):
+    return FlightOffer("XX", "100 USD", "PT3H", "08:00", origin, "11:00", destination, "")
+
+
+class FakeChat:
+    def __init__(self, history=()):
+        self.history = list(history)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Stub every upstream source; `routes` are the direct searches that find offers"""
+    calls = Counter()
+    routes = {(ORIGIN, DESTINATION)}
+
+    def search_flights(origin, destination, date):
+        calls["search_flights", origin, destination] += 1
+        offers = (offer(origin, destination),) if (origin, destination) in routes else ()
+        return FlightSearch(origin, destination, date, offers)
+
+    def search_hotels(destination, checkin, checkout):
+        calls["search_hotels"] += 1
+        return HotelSearch(destination, checkin, checkout)
+
+    def get_weather_range(destination, start, end):
+        calls["get_weather_range"] += 1
+        return []
+
+    def generate_itinerary_html(session, destination, duration, interests=""):
+        calls["generate_itinerary_html"] += 1
+        return "Day 1: Hike"
+
+    monkeypatch.setattr(sample, "search_flights", search_flights)
+    monkeypatch.setattr(sample, "search_hotels", search_hotels)
+    monkeypatch.setattr(sample, "get_weather_range", get_weather_range)
+    monkeypatch.setattr(sample, "generate_itinerary_html", generate_itinerary_html)
+    monkeypatch.setattr(sample, "gemini_model", lambda: SimpleNamespace(start_chat=FakeChat))
+    monkeypatch.setattr(sample, "parse_user_intent", lambda session, user_input: {
+        "intent": "continue", "is_greeting": False, "is_reset": False,
+        "extracted_info": {}, "missing_info": [], "next_question": ""
+    })
+
+    # Keep the memo of the turn so its counters can be checked afterwards
+    memos = []
+
+    class RecordingMemo(sample.TurnMemo):
+        def __init__(self):
+            super().__init__()
+            memos.append(self)
+
+    monkeypatch.setattr(sample, "TurnMemo", RecordingMemo)
+    return SimpleNamespace(calls=calls, routes=routes, memos=memos)
+
+
+def plan_session(session_id):
+    session = sample.sessions.get(session_id)
+    session.trip_context.update(PLAN_CONTEXT)
+    return session
+
+
+def test_plan_turn_fetches_each_source_once(upstream):
+    session = plan_session("test-plan-turn")
+    reply = sample.run_chat_turn(session, "let's go")
+
+    memo, = upstream.memos
+    assert memo.calls == Counter({
+        "search_flights": 1, "search_hotels": 1, "get_weather_range": 1, "generate_itinerary_html": 1
+    })
+    assert upstream.calls["generate_itinerary_html"] == 1
+    assert "Day 1: Hike" in reply
+
+
+def test_alternative_routes_reuse_searched_legs(upstream, monkeypatch):
+    # No direct flight; two routes through the same hub, and the direct leg suggested again
+    upstream.routes.clear()
+    upstream.routes.update({(ORIGIN, HUB), (HUB, DESTINATION)})
+    routes = [
+        {"type": "direct", "origin": ORIGIN, "destination": DESTINATION},
+        {"type": "hub_connection", "origin": ORIGIN, "hub": HUB, "destination": DESTINATION},
+        {"type": "nearby_origin", "origin": HUB, "destination": DESTINATION}
+    ]
+    monkeypatch.setattr(sample, "get_alternative_routes", lambda *args: routes)
+
+    session = plan_session("test-alternatives")
+    reply = sample.run_chat_turn(session, "let's go")
+
+    memo, = upstream.memos
+    # The direct leg was already searched by the plan fan-out
+    assert memo.hits["search_flights"] == 1
+    # Every distinct leg went upstream exactly once
+    assert memo.calls["search_flights"] == 3
+    for leg in [(ORIGIN, DESTINATION), (ORIGIN, HUB), (HUB, DESTINATION)]:
+        assert upstream.calls[("search_flights", *leg)] == 1
+    # The alternatives fill the flights section; the rest of the plan is still shown
+    assert f"Multi-city option via {HUB}" in reply
+    assert "Day 1: Hike" in reply and "Weather Forecast" in reply and "No hotels found" in reply
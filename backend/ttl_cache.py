@@ -0,0 +1,204 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Shared on-disk cache database, next to users.db by default
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "./cache.db")
+
+# Background refreshes of stale entries (stale-while-revalidate)
+refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+class SQLiteStore:
+    """Persistent key/value table with per-entry expiry; values are stored as JSON"""
+
+    def __init__(self, table, path=CACHE_DB_PATH):
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key, include_expired=False):
+        """Return (value, expires_at) or None if missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[1] < time.time() and not include_expired):
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def trim(self, max_rows):
+        """Keep only the `max_rows` entries that expire last, i.e. the most recently written"""
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key NOT IN "
+                f"(SELECT key FROM {self.table} ORDER BY expires_at DESC LIMIT ?)",
+                (max_rows,)
+            )
+            self._conn.commit()
+
+    def keys(self, prefix=""):
+        """Keys of unexpired entries starting with `prefix`"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key FROM {self.table} WHERE substr(key, 1, ?) = ? AND expires_at >= ?",
+                (len(prefix), prefix, time.time())
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL.
+    An optional SQLiteStore backs the memory tier so entries survive restarts;
+    keys must then be strings and values JSON-serializable.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, store=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Loads in progress, so concurrent misses for one key share a single upstream call
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+        stored = self.store.get(key) if self.store else None
+        with self._lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put(key, *stored)
+            return stored[0]
+
+    def get_or_load(self, key, loader, stale_seconds=0, should_cache=None):
+        """
+        Return the cached value for `key`, calling `loader()` on a miss.
+        Concurrent misses for the same key wait for one loader call instead of each
+        going upstream. Entries less than `stale_seconds` past expiry are returned
+        immediately while a single background refresh replaces them.
+        `should_cache(value)` can veto caching a result, e.g. an error.
+        """
+        now = time.time()
+        entry = self._lookup(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at >= now:
+                with self._lock:
+                    self.hits += 1
+                return value
+            if now - expires_at < stale_seconds:
+                with self._lock:
+                    self.stale_hits += 1
+                    refreshing = key in self._inflight
+                    if not refreshing:
+                        self._inflight[key] = Future()
+                if not refreshing:
+                    refresh_executor.submit(self._load, key, loader, should_cache)
+                return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                self.misses += 1
+                self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if is_owner:
+            return self._load(key, loader, should_cache)
+        return future.result()
+
+    def _lookup(self, key):
+        """Return (value, expires_at) from memory or the store, expired or not"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        stored = self.store.get(key, include_expired=True) if self.store else None
+        if stored is not None:
+            with self._lock:
+                self._put(key, *stored)
+        return stored
+
+    def _load(self, key, loader, should_cache):
+        with self._lock:
+            future = self._inflight[key]
+        try:
+            value = loader()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            if should_cache is None or should_cache(value):
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def set(self, key, value, ttl_seconds=None):
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            self._put(key, value, expires_at)
+        if self.store:
+            self.store.set(key, value, expires_at)
+
+    def _put(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            # Stale and coalesced lookups were served without their own upstream call too
+            total = self.hits + self.stale_hits + self.coalesced + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": round((total - self.misses) / total, 3) if total else 0.0,
+                "size": len(self._entries)
+            }
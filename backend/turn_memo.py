@@ -0,0 +1,41 @@
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+
+class TurnMemo:
+    """
+    Memoizes upstream calls (flights, hotels, weather, Gemini) for one chat turn.
+    Each distinct (function, arguments) pair runs once; repeated or concurrent
+    calls with the same arguments share its result.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        # Upstream invocations actually made this turn, by function name
+        self.calls = Counter()
+        # Calls answered from the memo instead of going upstream
+        self.hits = Counter()
+
+    def call(self, fn, *args):
+        key = (fn, args)
+        with self._lock:
+            future = self._results.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._results[key] = future
+                self.calls[fn.__name__] += 1
+            else:
+                self.hits[fn.__name__] += 1
+
+        if is_owner:
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def summary(self):
+        return f"upstream calls {dict(self.calls)}, memo hits {dict(self.hits)}"
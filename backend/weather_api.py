@@ -2,35 +2,110 @@ import requests
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
+from http_client import upstream
+from ttl_cache import TTLCache, SQLiteStore
+from records import DayForecast
+from render import forecast_text
 
-# Initialize Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel("models/gemini-1.5-flash-latest")
+WEATHER_URL = "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline"
+# Longest range fetched in one request; longer trips are cut to their first days
+MAX_RANGE_DAYS = 45
+# Per-day records, shared between trips and users whose dates overlap. Forecasts for the next
+# few days change often; dates beyond the forecast horizon are statistical climatology that
+# barely moves, and past days are observations that never change.
+WEATHER_TTL_NEAR_TERM_SECONDS = 3600                  # today .. +2 days
+WEATHER_TTL_FORECAST_SECONDS = 6 * 3600               # up to the 15-day forecast horizon
+WEATHER_TTL_CLIMATOLOGY_SECONDS = 7 * 24 * 3600       # further out
+WEATHER_TTL_HISTORICAL_SECONDS = 30 * 24 * 3600       # days already past
+FORECAST_HORIZON_DAYS = 15
+WEATHER_CACHE_MAX_DAYS = int(os.getenv("WEATHER_CACHE_MAX_DAYS", 8192))
+# Set WEATHER_CACHE_DISK=0 to keep the cache in memory only
+WEATHER_CACHE_DISK = os.getenv("WEATHER_CACHE_DISK", "1") == "1"
+day_cache = TTLCache(
+    max_entries=WEATHER_CACHE_MAX_DAYS,
+    ttl_seconds=WEATHER_TTL_FORECAST_SECONDS,
+    store=SQLiteStore("weather_days") if WEATHER_CACHE_DISK else None
+)
+if day_cache.store:
+    # Keep the on-disk table bounded across restarts
+    day_cache.store.purge_expired()
 
-def get_weather_climatology(location, date):
-    base_url = f"https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/{location}/{date}"
+def weather_key(location, day):
+    """'Paris, France ' and 'paris france' share cache entries"""
+    return f"{' '.join(location.lower().replace(',', ' ').split())}|{day}"
+
+def weather_ttl(day, today=None):
+    """How long a cached day stays fresh, by how far it is from today"""
+    days_ahead = (datetime.strptime(day, "%Y-%m-%d").date() - (today or datetime.now().date())).days
+    if days_ahead < 0:
+        return WEATHER_TTL_HISTORICAL_SECONDS
+    if days_ahead <= 2:
+        return WEATHER_TTL_NEAR_TERM_SECONDS
+    if days_ahead <= FORECAST_HORIZON_DAYS:
+        return WEATHER_TTL_FORECAST_SECONDS
+    return WEATHER_TTL_CLIMATOLOGY_SECONDS
+
+def weather_cache_stats():
+    return day_cache.stats()
+
+def trip_days(start_date, end_date):
+    """Every YYYY-MM-DD from start to end inclusive"""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    if end < start:
+        start, end = end, start
+    count = min((end - start).days + 1, MAX_RANGE_DAYS)
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(count)]
 
+def fetch_weather_days(location, start_date, end_date):
+    """One Visual Crossing timeline request for start..end, as per-day records"""
     params = {
         "key": os.getenv("WEATHER_API"),
         "include": "days",
         "elements": "datetime,tempmax,tempmin,precip,description",
         "unitGroup": "metric"  # use "us" for Fahrenheit
     }
-
-    response = requests.get(base_url, params=params)
-
-    if response.status_code == 200:
-        data = response.json()
-        day = data["days"][0]
-        weather_info = (
-            f"📍 Weather Forecast for {location} on {day['datetime']}:\n"
-            f"- Description: {day.get('description', 'N/A')}\n"
-            f"- Max Temperature: {day['tempmax']} °C\n"
-            f"- Min Temperature: {day['tempmin']} °C\n"
-            f"- Precipitation: {day['precip']} mm\n"
+    response = upstream.get(f"{WEATHER_URL}/{location}/{start_date}/{end_date}", params=params)
+    if response.status_code != 200:
+        raise RuntimeError(f"Weather API returned {response.status_code}: {response.text}")
+    return [
+        DayForecast(
+            location=location,
+            date=day["datetime"],
+            description=day.get("description", "N/A"),
+            tempmax=day.get("tempmax"),
+            tempmin=day.get("tempmin"),
+            precip=day.get("precip")
         )
-        return weather_info
-    else:
-        error_msg = f"❌ Failed to fetch weather data for {location} on {date}.\nError: {response.text}"
-        return error_msg
+        for day in response.json().get("days", [])
+    ]
+
+def get_weather_range(location, start_date, end_date=None):
+    """
+    DayForecast records for start..end inclusive. Days already cached are reused
+    and the rest come from a single range request.
+    """
+    location = location.strip()
+    days = trip_days(start_date, end_date or start_date)
+    # The cache holds plain dicts so the on-disk copy stays JSON
+    cached = {day: day_cache.get(weather_key(location, day)) for day in days}
+    forecasts = {day: DayForecast(**value) for day, value in cached.items() if value is not None}
+    missing = [day for day in days if day not in forecasts]
+    if missing:
+        print(f"[Weather] Fetching {location} {missing[0]}..{missing[-1]} ({len(forecasts)}/{len(days)} days cached)")
+        for forecast in fetch_weather_days(location, missing[0], missing[-1]):
+            day_cache.set(weather_key(location, forecast.date), forecast._asdict(), ttl_seconds=weather_ttl(forecast.date))
+            if forecast.date in cached:
+                forecasts[forecast.date] = forecast
+    # Cached days may have been stored under another spelling of the location
+    return [forecasts[day]._replace(location=location) for day in days if day in forecasts]
+
+def get_weather_climatology(location, date):
+    """Formatted forecast for a single day"""
+    try:
+        records = get_weather_range(location, date)
+    except (requests.RequestException, RuntimeError, ValueError) as e:
+        return f"❌ Failed to fetch weather data for {location} on {date}.\nError: {e}"
+    if not records:
+        return f"❌ Failed to fetch weather data for {location} on {date}.\nError: no forecast returned"
+    return forecast_text(records[0])
@@ -21,11 +21,57 @@ const SECTION_LABELS = {
   text: 'Info',
 };
 
+// Plan sections streamed by /api/chat/stream, in the order the final reply shows them
+const PLAN_SECTION_ORDER = ['itinerary', 'weather', 'flights', 'hotels'];
+
+// Messages fetched per chat-history page; older pages load on request
+const HISTORY_PAGE_SIZE = 50;
+
+// Read a Server-Sent Events response body, calling onEvent(type, data) for each event
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let type = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event: ')) type = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+      onEvent(type, JSON.parse(data));
+    }
+  }
+};
+
+// Anonymous conversations are kept apart by an id this browser generates once and sends with every message
+const getChatSessionId = () => {
+  let sessionId = localStorage.getItem('chatSessionId');
+  if (!sessionId) {
+    sessionId = window.crypto?.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem('chatSessionId', sessionId);
+  }
+  return sessionId;
+};
+
 const ChatWindow = () => {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [isHistoryLoading, setIsHistoryLoading] = useState(true);
+  // Cursor for the next page of older history, null once everything is loaded
+  const [historyBefore, setHistoryBefore] = useState(null);
+  const [isOlderLoading, setIsOlderLoading] = useState(false);
+  const skipScrollRef = useRef(false);
   const [userName, setUserName] = useState('Traveler');  
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
@@ -50,48 +96,62 @@ const ChatWindow = () => {
     }
   }, []);
   useEffect(() => {
+    // Loading older history adds messages at the top; stay where the user is reading
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
-  const fetchChatHistory = async (token) => {
-    try {
-      setIsHistoryLoading(true);
-      const response = await fetch(`http://localhost:8000/api/chat-history?token=${token}`);
+  // Fetch one page of history: the most recent messages, or those before the `before` cursor
+  const fetchHistoryPage = async (token, before) => {
+    const params = new URLSearchParams({ token, limit: HISTORY_PAGE_SIZE });
+    if (before) {
+      params.set('before', before);
+    }
+    const response = await fetch(`http://localhost:8000/api/chat-history?${params}`);
 
-      if (!response.ok) {
-        throw new Error('Failed to load chat history');
-      }
+    if (!response.ok) {
+      throw new Error('Failed to load chat history');
+    }
 
-      const data = await response.json();
-
-      if (data.messages && data.messages.length > 0) {
-        // Convert API response to message format used in component
-        const formattedMessages = data.messages.map(msg => {
-          if (msg.sender === 'user') {
-            return {
-              text: msg.content,
-              sender: 'user',
-              timestamp: new Date(msg.timestamp)
-            };
-          } else {
-            // Try to parse bot responses as sections if possible
-            try {
-              const sections = processResponse(msg.content);
-              return {
-                text: sections,
-                sender: 'assistant',
-                timestamp: new Date(msg.timestamp)
-              };
-            } catch (e) {
-              // Fallback to plain text if parsing fails
-              return {
-                text: msg.content,
-                sender: 'assistant',
-                timestamp: new Date(msg.timestamp)
-              };
-            }
-          }
-        });
+    const data = await response.json();
+    // Convert API response to message format used in component
+    const formattedMessages = data.messages.map(msg => {
+      if (msg.sender === 'user') {
+        return {
+          text: msg.content,
+          sender: 'user',
+          timestamp: new Date(msg.timestamp)
+        };
+      } else {
+        // Try to parse bot responses as sections if possible
+        try {
+          const sections = processResponse(msg.content);
+          return {
+            text: sections,
+            sender: 'assistant',
+            timestamp: new Date(msg.timestamp)
+          };
+        } catch (e) {
+          // Fallback to plain text if parsing fails
+          return {
+            text: msg.content,
+            sender: 'assistant',
+            timestamp: new Date(msg.timestamp)
+          };
+        }
+      }
+    });
+    setHistoryBefore(data.next_before);
+    return formattedMessages;
+  };
 
+  const fetchChatHistory = async (token) => {
+    try {
+      setIsHistoryLoading(true);
+      const formattedMessages = await fetchHistoryPage(token, null);
+      if (formattedMessages.length > 0) {
         setMessages(formattedMessages);
       }
     } catch (error) {
@@ -101,10 +161,27 @@ const ChatWindow = () => {
     }
   };
 
+  const loadOlderMessages = async () => {
+    const token = localStorage.getItem('token');
+    if (!token || !historyBefore) return;
+    try {
+      setIsOlderLoading(true);
+      const olderMessages = await fetchHistoryPage(token, historyBefore);
+      skipScrollRef.current = true;
+      setMessages(prev => [...olderMessages, ...prev]);
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      setIsOlderLoading(false);
+    }
+  };
+
   const handleLogout = () => {
     // Remove token and user info from local storage
     localStorage.removeItem('token');
     localStorage.removeItem('userName');
+    // The next visitor on this browser starts a new anonymous conversation
+    localStorage.removeItem('chatSessionId');
     // Redirect to login page
     navigate('/login');
   };
@@ -162,14 +239,15 @@ const ChatWindow = () => {
     try {
       // Get token from localStorage
       const token = localStorage.getItem('token');
-      const response = await fetch('http://localhost:8000/api/chat', {
+      const response = await fetch('http://localhost:8000/api/chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
           message: userMessage,
-          token: token // Send token with each request
+          token: token, // Send token with each request
+          session_id: getChatSessionId()
         }),
       });
 
@@ -177,12 +255,41 @@ const ChatWindow = () => {
         throw new Error('Network response was not ok');
       }
 
-      const data = await response.json();
-      const sections = processResponse(data.response);
-      setMessages(prev => [...prev, { text: sections, sender: 'assistant' }]);
+      // Show each plan section as soon as the server has it, and the itinerary as it is written
+      const sections = {};
+      let itineraryText = '';
+      let streamError = null;
+      const showPartial = () => {
+        const parts = { ...sections };
+        if (!parts.itinerary && itineraryText) {
+          parts.itinerary = "Here's the itinerary for your trip:\n\n" + itineraryText;
+        }
+        const partial = PLAN_SECTION_ORDER.filter(name => parts[name]).map(name => parts[name]).join('');
+        updateStreamingMessage(processResponse(partial), true);
+      };
+
+      await readEventStream(response, (type, data) => {
+        if (type === 'session') {
+          localStorage.setItem('chatSessionId', data.session_id);
+        } else if (type === 'token') {
+          itineraryText += data.text;
+          showPartial();
+        } else if (type === 'section') {
+          sections[data.name] = data.text;
+          showPartial();
+        } else if (type === 'done') {
+          updateStreamingMessage(processResponse(data.response), false);
+        } else if (type === 'error') {
+          streamError = new Error(data.detail);
+        }
+      });
+      if (streamError) {
+        throw streamError;
+      }
     } catch (error) {
       console.error('Error:', error);
-      setMessages(prev => [...prev, {
+      // Drop any partial sections; the error message replaces them
+      setMessages(prev => [...prev.filter(message => !message.streaming), {
         text: [{ type: 'text', content: ["Sorry, I encountered an error. Please try again."] }],
         sender: 'assistant',
         error: true
@@ -192,6 +299,18 @@ const ChatWindow = () => {
     }
   };
 
+  // Replace the assistant message being streamed, adding it on the first update
+  const updateStreamingMessage = (sections, streaming) => {
+    setMessages(prev => {
+      const message = { text: sections, sender: 'assistant', streaming };
+      const last = prev[prev.length - 1];
+      if (last && last.streaming) {
+        return [...prev.slice(0, -1), message];
+      }
+      return [...prev, message];
+    });
+  };
+
   const renderSection = (section) => {
     switch (section.type) {
       case 'flight':
@@ -348,6 +467,11 @@ const ChatWindow = () => {
         </div>
       </div>
       <div className="chat-messages">
+      {!isHistoryLoading && historyBefore && (
+          <button className="load-older-button" onClick={loadOlderMessages} disabled={isOlderLoading}>
+            {isOlderLoading ? 'Loading...' : 'Load earlier messages'}
+          </button>
+        )}
       {isHistoryLoading ? (
           <div className="loading-history">
             <div className="typing-indicator">